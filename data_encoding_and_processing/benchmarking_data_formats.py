@@ -0,0 +1,587 @@
+"""
+This script shows how to compare the different ways of reading and writing
+the data formats covered in this package, on synthetic data of any size.
+
+The recipes make claims such as parse_and_remove() using 7MB rather than 450MB,
+or reading a whole document being twice as fast. Those depend on the data and
+the machine, so rather than trust them this generates a dataset for each format
+- stock rows, binary records, JSON objects, pothole XML and polygons - and times
+every read and write path over it, reporting records per second, the peak
+resident memory of the process and the size of the file on disk.
+
+Run it as a script:
+
+    python benchmarking_data_formats.py -n 1000000 --json results.json
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, OrderedDict, namedtuple
+from struct import Struct
+from xml.etree.ElementTree import Element, ElementTree, SubElement, parse
+from xml.sax.saxutils import escape
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from decoding_polygon_points_in_bulk import write_polys as write_polys_bulk
+from extracting_fields_from_huge_xml_files import compile_extractor
+from parsing_huge_xml_files_incrementally import parse_and_remove
+from reading_and_writing_binary_arrays_of_structures import read_records, unpack_records, write_records
+from reading_and_writing_json_streams import Event, JSONLinesWriter, JSONObject, iter_json_lines, make_object_hook
+from reading_csv_data_into_columns import STOCKS_SCHEMA, read_columns
+from reading_nested_variable_sized_binary_structures import read_polys, write_polys
+from writing_binary_arrays_of_structures_in_bulk import write_records_bulk
+from writing_xml_incrementally import XMLStreamWriter
+
+STOCK_HEADERS = ['Symbol', 'Price', 'Date', 'Time', 'Change', 'Volume']
+SYMBOLS = ['AA', 'AIG', 'AXP', 'BA', 'C', 'CAT', 'GOOG', 'IBM', 'MSFT', 'AT&T']
+RECORD_FORMAT = '<idd'
+ZIPS = ['606{:02d}'.format(n) for n in range(60)]
+
+
+# Synthetic datasets. Each takes a filename, a number of records and a
+# random.Random, and writes the file.
+
+def make_stocks(filename, n, rand):
+    with open(filename, 'w', newline='') as f:
+        f_csv = csv.writer(f)
+        f_csv.writerow(STOCK_HEADERS)
+        f_csv.writerows((rand.choice(SYMBOLS), round(rand.uniform(10, 500), 2), '6/11/2007', '9:36am',
+                         round(rand.uniform(-1, 1), 2), rand.randrange(1000, 1000000))
+                        for _ in range(n))
+
+
+def make_records(filename, n, rand):
+    with open(filename, 'wb') as f:
+        write_records_bulk(((i, rand.random(), rand.random()) for i in range(n)), RECORD_FORMAT, f)
+
+
+def _objects(n, rand):
+    return ({'name': rand.choice(SYMBOLS), 'shares': rand.randrange(1, 1000),
+             'price': round(rand.uniform(10, 500), 2)} for _ in range(n))
+
+
+def make_json(filename, n, rand):
+    with open(filename, 'w') as f:
+        json.dump(list(_objects(n, rand)), f)
+
+
+def make_json_lines(filename, n, rand):
+    with open(filename, 'w') as f:
+        with JSONLinesWriter(f) as writer:
+            writer.write_many(_objects(n, rand))
+
+
+def make_potholes(filename, n, rand):
+    # The same layout as the City of Chicago potholes download
+    row = ('<row _id="{}"><creation_date>2012-{:02d}-{:02d}T00:00:00</creation_date>'
+           '<status>Completed</status><street_address>{} W {} ST</street_address>'
+           '<zip>{}</zip><latitude>{:.6f}</latitude><longitude>{:.6f}</longitude></row>\n')
+    with open(filename, 'w') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<response><row>\n')
+        for i in range(n):
+            f.write(row.format(i, rand.randint(1, 12), rand.randint(1, 28), rand.randrange(10000),
+                               escape(rand.choice(['MADISON', 'STATE', "O'BRIEN"])),
+                               rand.choice(ZIPS), rand.uniform(41.6, 42.0), rand.uniform(-87.9, -87.5)))
+        f.write('</row></response>\n')
+
+
+def _polygons(n, rand):
+    return [[(rand.uniform(0, 100), rand.uniform(0, 100)) for _ in range(rand.randint(3, 12))]
+            for _ in range(n)]
+
+
+def make_polys(filename, n, rand):
+    write_polys_bulk(filename, _polygons(n, rand))
+
+
+# dataset filename: (function to make it, records per requested record)
+DATASETS = {
+    'stocks.csv': (make_stocks, 1),
+    'records.bin': (make_records, 1),
+    'objects.json': (make_json, 1),
+    'objects.jsonl': (make_json_lines, 1),
+    'potholes.xml': (make_potholes, 1),
+    # Each polygon holds 7 or so points
+    'polys.bin': (make_polys, 0.1),
+}
+
+
+def make_datasets(directory, n, seed=0):
+    """
+    Write every dataset with n records into directory, returning a dict of
+    dataset name to filename
+    """
+    rand = random.Random(seed)
+    filenames = {}
+    for name, (make, scale) in DATASETS.items():
+        filename = filenames[name] = os.path.join(directory, name)
+        make(filename, max(1, int(n * scale)), rand)
+    return filenames
+
+
+# The cases
+
+Case = namedtuple('Case', ['name', 'format', 'operation', 'dataset', 'func', 'setup'])
+CASES = OrderedDict()
+
+
+def case(format, operation, dataset, setup=None):
+    """
+    Register a benchmark. Read cases are called with the dataset filename.
+    Write cases are called with setup(dataset filename) and an output filename.
+    Either way they return the number of records handled.
+    """
+    def decorate(func):
+        # A trailing _ keeps a case from hiding the recipe function of the same name
+        name = '{}.{}.{}'.format(format, operation, func.__name__.rstrip('_'))
+        CASES[name] = Case(name, format, operation, dataset, func, setup)
+        return func
+    return decorate
+
+
+@case('csv', 'read', 'stocks.csv')
+def reader(filename):
+    count = 0
+    with open(filename, newline='') as f:
+        f_csv = csv.reader(f)
+        headers = next(f_csv)
+        for row in f_csv:
+            count += 1
+    return count
+
+
+@case('csv', 'read', 'stocks.csv')
+def reader_namedtuple(filename):
+    count = 0
+    with open(filename, newline='') as f:
+        f_csv = csv.reader(f)
+        Row = namedtuple('Row', next(f_csv))
+        for r in f_csv:
+            row = Row(*r)
+            count += 1
+    return count
+
+
+@case('csv', 'read', 'stocks.csv')
+def dict_reader(filename):
+    count = 0
+    with open(filename, newline='') as f:
+        for row in csv.DictReader(f):
+            count += 1
+    return count
+
+
+@case('csv', 'read', 'stocks.csv')
+def reader_converted(filename):
+    col_types = [col_type for _, col_type in STOCKS_SCHEMA]
+    count = 0
+    with open(filename, newline='') as f:
+        f_csv = csv.reader(f)
+        headers = next(f_csv)
+        for row in f_csv:
+            row = tuple(convert(value) for convert, value in zip(col_types, row))
+            count += 1
+    return count
+
+
+@case('csv', 'read', 'stocks.csv')
+def columns(filename):
+    return len(read_columns(filename, STOCKS_SCHEMA)['Symbol'])
+
+
+def _load_stocks(filename):
+    with open(filename, newline='') as f:
+        f_csv = csv.reader(f)
+        headers = next(f_csv)
+        return headers, list(f_csv)
+
+
+@case('csv', 'write', 'stocks.csv', setup=_load_stocks)
+def writer(data, filename):
+    headers, rows = data
+    with open(filename, 'w', newline='') as f:
+        f_csv = csv.writer(f)
+        f_csv.writerow(headers)
+        f_csv.writerows(rows)
+    return len(rows)
+
+
+def _load_stock_dicts(filename):
+    with open(filename, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+@case('csv', 'write', 'stocks.csv', setup=_load_stock_dicts)
+def dict_writer(rows, filename):
+    with open(filename, 'w', newline='') as f:
+        f_csv = csv.DictWriter(f, STOCK_HEADERS)
+        f_csv.writeheader()
+        f_csv.writerows(rows)
+    return len(rows)
+
+
+@case('json', 'read', 'objects.json')
+def load(filename):
+    with open(filename) as f:
+        return len(json.load(f))
+
+
+@case('json', 'read', 'objects.json')
+def load_ordered_dict(filename):
+    with open(filename) as f:
+        return len(json.load(f, object_pairs_hook=OrderedDict))
+
+
+class RecipeJSONObject:
+    # JSONObject as defined in reading_and_writing_json.py
+    def __init__(self, d):
+        self.__dict__ = d
+
+
+@case('json', 'read', 'objects.json')
+def load_object_hook(filename):
+    with open(filename) as f:
+        return len(json.load(f, object_hook=RecipeJSONObject))
+
+
+@case('json', 'read', 'objects.json')
+def load_made_object_hook(filename):
+    with open(filename) as f:
+        return len(json.load(f, object_hook=make_object_hook(JSONObject)))
+
+
+@case('json', 'read', 'objects.json')
+def load_slots_object_hook(filename):
+    with open(filename) as f:
+        return len(json.load(f, object_hook=make_object_hook(Event)))
+
+
+@case('json', 'read', 'objects.jsonl')
+def json_lines(filename):
+    count = 0
+    with open(filename) as f:
+        for obj in iter_json_lines(f):
+            count += 1
+    return count
+
+
+def _load_json(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+@case('json', 'write', 'objects.json', setup=_load_json)
+def dump(objs, filename):
+    with open(filename, 'w') as f:
+        json.dump(objs, f)
+    return len(objs)
+
+
+@case('json', 'write', 'objects.json', setup=_load_json)
+def json_lines_writer(objs, filename):
+    with open(filename, 'w') as f:
+        with JSONLinesWriter(f) as writer:
+            writer.write_many(objs)
+    return len(objs)
+
+
+@case('binary', 'read', 'records.bin')
+def read_records_(filename):
+    count = 0
+    with open(filename, 'rb') as f:
+        for rec in read_records(RECORD_FORMAT, f):
+            count += 1
+    return count
+
+
+@case('binary', 'read', 'records.bin')
+def unpack_records_(filename):
+    count = 0
+    with open(filename, 'rb') as f:
+        data = f.read()
+    for rec in unpack_records(RECORD_FORMAT, data):
+        count += 1
+    return count
+
+
+@case('binary', 'read', 'records.bin')
+def iter_unpack(filename):
+    count = 0
+    with open(filename, 'rb') as f:
+        data = f.read()
+    for rec in Struct(RECORD_FORMAT).iter_unpack(data):
+        count += 1
+    return count
+
+
+@case('binary', 'read', 'records.bin')
+def numpy_fromfile(filename):
+    if np is None:
+        raise RuntimeError('numpy is not installed')
+    return len(np.fromfile(filename, dtype='<i4,<f8,<f8'))
+
+
+def _load_records(filename):
+    with open(filename, 'rb') as f:
+        return list(Struct(RECORD_FORMAT).iter_unpack(f.read()))
+
+
+@case('binary', 'write', 'records.bin', setup=_load_records)
+def write_records_(records, filename):
+    with open(filename, 'wb') as f:
+        write_records(records, RECORD_FORMAT, f)
+    return len(records)
+
+
+@case('binary', 'write', 'records.bin', setup=_load_records)
+def write_records_bulk_(records, filename):
+    with open(filename, 'wb') as f:
+        write_records_bulk(records, RECORD_FORMAT, f)
+    return len(records)
+
+
+@case('xml', 'read', 'potholes.xml')
+def parse_iterfind(filename):
+    potholes_by_zip = Counter()
+    doc = parse(filename)
+    for pothole in doc.iterfind('row/row'):
+        potholes_by_zip[pothole.findtext('zip')] += 1
+    return sum(potholes_by_zip.values())
+
+
+@case('xml', 'read', 'potholes.xml')
+def parse_and_remove_(filename):
+    potholes_by_zip = Counter()
+    for pothole in parse_and_remove(filename, 'row/row'):
+        potholes_by_zip[pothole.findtext('zip')] += 1
+    return sum(potholes_by_zip.values())
+
+
+@case('xml', 'read', 'potholes.xml')
+def extractor(filename):
+    potholes_by_zip = Counter()
+    for zipcode, in compile_extractor('row/row', ['zip'])(filename):
+        potholes_by_zip[zipcode] += 1
+    return sum(potholes_by_zip.values())
+
+
+def _load_potholes(filename):
+    return [{child.tag: child.text for child in row} for row in parse_and_remove(filename, 'row/row')]
+
+
+@case('xml', 'write', 'potholes.xml', setup=_load_potholes)
+def element_tree(rows, filename):
+    # <row><row>...</row></row>, the same document stream_writer() writes, so
+    # that the sizes on disk can be compared
+    root = Element('row')
+    for d in rows:
+        elem = SubElement(root, 'row')
+        for key, val in d.items():
+            SubElement(elem, key).text = str(val)
+    ElementTree(root).write(filename, encoding='utf-8', xml_declaration=True)
+    return len(rows)
+
+
+@case('xml', 'write', 'potholes.xml', setup=_load_potholes)
+def stream_writer(rows, filename):
+    with open(filename, 'wb') as f:
+        with XMLStreamWriter(f, 'row') as writer:
+            writer.write_many('row', rows)
+    return len(rows)
+
+
+@case('polygons', 'read', 'polys.bin')
+def read_polys_(filename):
+    return len(read_polys(filename))
+
+
+@case('polygons', 'write', 'polys.bin', setup=read_polys)
+def write_polys_(polys, filename):
+    write_polys(filename, polys)
+    return len(polys)
+
+
+@case('polygons', 'write', 'polys.bin', setup=read_polys)
+def write_polys_bulk_(polys, filename):
+    write_polys_bulk(filename, polys)
+    return len(polys)
+
+
+# Measuring
+
+def _proc_status(field):
+    # A memory figure from /proc/self/status in bytes, or None off Linux
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss():
+    """
+    The most memory this process has had resident, in bytes, or None if it
+    can not be found out on this platform
+    """
+    # On Linux ru_maxrss is carried over from the parent through fork and
+    # exec, so a child would report the parent's peak. VmHWM starts afresh
+    peak = _proc_status('VmHWM')
+    if peak is not None or resource is None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def reset_peak_rss():
+    """
+    Start the peak from the current resident memory, where Linux allows it
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def measure(name, filename, repeat=3):
+    """
+    Run one case repeat times, returning a dict of results. The time is the
+    best of the runs.
+    """
+    c = CASES[name]
+    data = c.setup(filename) if c.setup else filename
+    output = '{}.{}.out'.format(filename, name) if c.operation == 'write' else None
+    # So that the setup does not count towards the peak
+    reset_peak_rss()
+    baseline = peak_rss()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = c.func(data, output) if output else c.func(data)
+        times.append(time.perf_counter() - start)
+    peak = peak_rss()
+
+    size = os.path.getsize(output or filename)
+    if output:
+        os.remove(output)
+    seconds = min(times)
+    return {
+        'case': name,
+        'format': c.format,
+        'operation': c.operation,
+        'records': count,
+        'seconds': seconds,
+        'records_per_sec': count / seconds if seconds else None,
+        'mb_per_sec': size / seconds / 1e6 if seconds else None,
+        'bytes_on_disk': size,
+        'baseline_rss': baseline,
+        'peak_rss': peak,
+    }
+
+
+def run(n=100000, repeat=3, only=None, directory=None, seed=0):
+    """
+    Generate the datasets and run every case whose name contains one of the
+    strings in only (or all of them). Each case runs in a fresh process so
+    that its peak memory use is not hidden by an earlier case.
+    """
+    with tempfile.TemporaryDirectory(dir=directory) as tmpdir:
+        filenames = make_datasets(tmpdir, n, seed)
+        names = [name for name in CASES if not only or any(s in name for s in only)]
+        ctx = multiprocessing.get_context('spawn')
+        results = []
+        for name in names:
+            with ctx.Pool(1) as pool:
+                results.append(pool.apply(measure, (name, filenames[CASES[name].dataset], repeat)))
+        return results
+
+
+def _mb(nbytes):
+    return '-' if nbytes is None else '{:.1f}'.format(nbytes / 1e6)
+
+
+def print_table(results, file=sys.stdout):
+    print('{:40} {:>12} {:>9} {:>10} {:>10}'.format('case', 'records/s', 'MB/s', 'peak MB', 'file MB'),
+          file=file)
+    for r in results:
+        print('{:40} {:12,.0f} {:9.1f} {:>10} {:>10}'.format(
+            r['case'], r['records_per_sec'], r['mb_per_sec'], _mb(r['peak_rss']), _mb(r['bytes_on_disk'])),
+            file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the data formats recipes')
+    parser.add_argument('-n', '--records', type=int, default=100000, help='records per dataset')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='runs per case, the best is kept')
+    parser.add_argument('-k', '--only', action='append', help='only run cases containing this string')
+    parser.add_argument('--json', metavar='FILE', help="write the results as JSON ('-' for stdout)")
+    parser.add_argument('--dir', help='where to make the datasets')
+    args = parser.parse_args(argv)
+
+    results = run(args.records, args.repeat, args.only, args.dir)
+    if args.json:
+        report = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'records': args.records,
+            'repeat': args.repeat,
+            'results': results,
+        }
+        if args.json == '-':
+            json.dump(report, sys.stdout, indent=2)
+            return
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    print_table(results)
+
+
+# Usage
+if __name__ == '__main__':
+    main()
+
+"""
+Each case runs in a new process started with the spawn method, so the peak RSS
+reported is that of the case alone rather than of everything run before it.
+baseline_rss is the memory in use just before the timed runs - the
+interpreter, the imports and, for write cases, the records being written - so
+peak_rss minus baseline_rss is what reading or writing the file cost.
+
+On Linux the peak is read from VmHWM in /proc/self/status rather than from
+getrusage(), whose ru_maxrss survives fork and exec - every case would
+otherwise report the peak of the parent that generated the datasets. Writing
+5 to /proc/self/clear_refs resets VmHWM after the setup. Elsewhere
+ru_maxrss is used, and baseline_rss includes whatever the setup peaked at.
+
+The read cases restate the loops from reading_and_writing_csv.py and
+reading_and_writing_json.py, and that recipe's JSONObject class, since they
+only exist as module level code. load_object_hook is that JSONObject, compared
+with the two kinds of hook make_object_hook() builds. The cases call
+read_records(), unpack_records() and parse_and_remove() from their recipes
+directly. Those modules keep the last definition of each function, so
+unpack_records() is the version that slices the data rather than the
+unpack_from() one. The two XML write cases produce the same <row><row>
+document, so their file sizes can be compared.
+
+The numbers from --json are plain dicts, ready to be compared between machines
+or loaded into a DataFrame with pandas.DataFrame(report['results']).
+"""
@@ -0,0 +1,161 @@
+"""
+This script shows how to load a large number of rows into sqlite3 quickly and
+how to read large query results back without holding them all in memory.
+
+interacting_with_relational_database.py inserts with executemany() and commits
+after each statement, then loops over db.execute() for results. For tens of
+millions of rows the cost is dominated by commits - each one waits for the data
+to reach the disk. Loading everything in a single transaction, with the journal
+settings relaxed while doing so, removes most of that cost.
+"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+
+def connect(database, cached_statements=256, **kwargs):
+    """
+    Open a connection set up for bulk work.
+
+    sqlite3 already keeps a cache of prepared statements per connection,
+    keyed by the SQL text, so reusing the same query string with different
+    parameters skips the parsing step. cached_statements sets its size.
+    """
+    db = sqlite3.connect(database, cached_statements=cached_statements, **kwargs)
+    # Write ahead logging lets readers carry on while a load is running
+    db.execute('pragma journal_mode=wal')
+    db.execute('pragma synchronous=normal')
+    db.execute('pragma temp_store=memory')
+    return db
+
+
+def bulk_insert(db, sql, rows, chunk_size=10000):
+    """
+    Insert rows (any iterable, such as a generator) with sql in a single
+    transaction, chunk_size rows per executemany() call.
+    Returns the number of rows inserted.
+    """
+    rows = iter(rows)
+    count = 0
+    # The connection as a context manager commits at the end, or rolls back on error
+    with db:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            db.executemany(sql, chunk)
+            count += len(chunk)
+    return count
+
+
+def iter_query(db, sql, params=(), batch_size=1000):
+    """
+    Generate the rows of a query, fetching batch_size rows at a time
+    """
+    c = db.cursor()
+    c.arraysize = batch_size
+    c.execute(sql, params)
+    try:
+        while True:
+            rows = c.fetchmany()
+            if not rows:
+                break
+            yield from rows
+    finally:
+        c.close()
+
+
+class ReaderPool:
+    """
+    A small pool of read-only connections that can be shared between threads.
+    Each connection is only used by one thread at a time.
+    """
+
+    def __init__(self, database, size=4, cached_statements=256):
+        self._connections = queue.Queue()
+        uri = 'file:{}?mode=ro'.format(os.path.abspath(database))
+        for n in range(size):
+            db = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                 cached_statements=cached_statements)
+            self._connections.put(db)
+        self._size = size
+
+    @contextmanager
+    def connection(self, timeout=None):
+        db = self._connections.get(timeout=timeout)
+        try:
+            yield db
+        finally:
+            self._connections.put(db)
+
+    def close(self):
+        for n in range(self._size):
+            self._connections.get().close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_ty, exc_val, tb):
+        self.close()
+
+
+# Usage
+if __name__ == '__main__':
+    import random
+
+    def generate_stocks(n):
+        symbols = ['GOOG', 'FB', 'APPL', 'HPQ', 'IBM', 'AA']
+        for i in range(n):
+            yield (random.choice(symbols), random.randint(1, 1000), round(random.uniform(1, 600), 2))
+
+    db = connect('database.db')
+    db.execute('create table if not exists portfolio (symbol text, shares integer, price real)')
+    print(bulk_insert(db, 'insert into portfolio values (?,?,?)', generate_stocks(1000000)))
+
+    for row in iter_query(db, 'select * from portfolio where price >= ?', (500,), batch_size=5000):
+        pass
+
+    def worker(pool, symbol):
+        with pool.connection() as conn:
+            total, = conn.execute('select sum(shares * price) from portfolio where symbol = ?',
+                                  (symbol,)).fetchone()
+            print(symbol, total)
+
+    with ReaderPool('database.db', size=4) as pool:
+        threads = [threading.Thread(target=worker, args=(pool, symbol))
+                   for symbol in ['GOOG', 'FB', 'APPL', 'HPQ']]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    db.close()
+
+"""
+Some notes on the settings used.
+
+journal_mode=wal is stored in the database file, so it only needs setting once.
+With it, readers see the last committed state and are never blocked by a
+writer, which is what allows the ReaderPool connections to run queries while a
+load is in progress.
+
+With WAL, synchronous=normal only calls fsync() when the log is checkpointed
+into the database, not on every commit, so a load in one transaction is not
+held up waiting for the disk. A power failure may lose the last transactions,
+but can not corrupt the database. synchronous=off would skip the remaining
+fsync() calls too, but SQLite documents that the database can then be
+corrupted by an operating system crash or power loss, so it is not used.
+Leaving the setting alone also means bulk_insert() works on a connection
+with a transaction already open, where SQLite refuses to change it.
+
+executemany() accepts a generator directly, but feeding it fixed size chunks
+keeps the number of rows materialised at once bounded, without costing an
+extra commit per chunk.
+
+Python's sqlite3 connections cannot be used from two threads at the same time,
+which is why the pool hands each connection to a single thread at a time rather
+than sharing one between them.
+"""
@@ -0,0 +1,225 @@
+"""
+This script shows how to serialize instances to JSON and back using an
+encoder and decoder compiled once per class, rather than inspecting every
+object as it goes past.
+
+serialize_instance() in reading_and_writing_json.py builds a dict from
+vars(obj) for every object and unserialize_object() looks the class up
+by name and sets the attributes one at a time with setattr(). With
+millions of small objects that reflection adds up.
+
+If the fields of a class are known up front - from __slots__, from a
+_fields attribute or simply by listing them - plain Python source
+for an encoder and a decoder can be generated and exec'd once when the
+class is registered.
+"""
+import json
+
+
+def class_fields(cls):
+    """
+    Work out the fields of a class from _fields or __slots__
+    """
+    fields = getattr(cls, '_fields', None)
+    if fields is not None:
+        return tuple(fields)
+    slots = []
+    for klass in reversed(cls.__mro__):
+        names = klass.__dict__.get('__slots__', ())
+        if isinstance(names, str):
+            names = (names,)
+        slots.extend(name for name in names if name not in ('__dict__', '__weakref__'))
+    if slots:
+        return tuple(slots)
+    raise TypeError('Cannot determine the fields of {}, pass them explicitly'.format(cls.__name__))
+
+
+def _compile(source, name, namespace):
+    exec(source, namespace)
+    return namespace[name]
+
+
+class SerializerRegistry:
+    """
+    Holds the compiled encoders and decoders for a set of classes.
+
+    With compact=True instances are encoded positionally as
+    {"__Point__": [2, 3]} instead of {"__classname__": "Point", "x": 2, "y": 3}.
+    Both forms are understood when decoding.
+    """
+
+    def __init__(self, compact=False):
+        self.compact = compact
+        self._encoders = {}
+        self._decoders = {}
+        self._compact_decoders = {}
+
+    def register(self, cls, fields=None, name=None):
+        name = name or cls.__name__
+        fields = tuple(fields) if fields is not None else class_fields(cls)
+        for field in fields:
+            if not field.isidentifier():
+                raise ValueError('Bad field name {!r}'.format(field))
+
+        namespace = {'cls': cls, 'new': cls.__new__}
+        values = ', '.join('obj.{}'.format(f) for f in fields)
+        if self.compact:
+            encode_source = 'def encode(obj):\n    return {{{!r}: [{}]}}\n'.format(
+                '__{}__'.format(name), values)
+        else:
+            items = ''.join(', {!r}: obj.{}'.format(f, f) for f in fields)
+            encode_source = 'def encode(obj):\n    return {{"__classname__": {!r}{}}}\n'.format(
+                name, items)
+
+        # Like unserialize_object() the instance is made without calling __init__
+        targets = ''.join('obj.{}, '.format(f) for f in fields)
+        decode_source = ('def decode(values):\n'
+                         '    obj = new(cls)\n'
+                         '    {targets}= values\n'
+                         '    return obj\n'
+                         'def decode_dict(d):\n'
+                         '    obj = new(cls)\n'
+                         '    {targets}= {lookups}\n'
+                         '    return obj\n').format(
+            targets=targets, lookups=''.join('d[{!r}], '.format(f) for f in fields))
+        if not fields:
+            decode_source = ('def decode(values):\n    return new(cls)\n'
+                             'def decode_dict(d):\n    return new(cls)\n')
+
+        self._encoders[cls] = _compile(encode_source, 'encode', namespace)
+        _compile(decode_source, 'decode', namespace)
+        self._compact_decoders['__{}__'.format(name)] = namespace['decode']
+        self._decoders[name] = namespace['decode_dict']
+        return cls
+
+    def default(self, obj):
+        """
+        Use as json.dumps(obj, default=registry.default)
+        """
+        try:
+            encode = self._encoders[type(obj)]
+        except KeyError:
+            raise TypeError('Object of type {} is not registered'.format(type(obj).__name__)) from None
+        return encode(obj)
+
+    def object_hook(self, d):
+        """
+        Use as json.loads(s, object_hook=registry.object_hook)
+        """
+        if len(d) == 1:
+            for key, values in d.items():
+                decode = self._compact_decoders.get(key)
+                if decode is not None:
+                    return decode(values)
+            # Otherwise it may still be {'__classname__': ...} for a class with no fields
+        clsname = d.get('__classname__')
+        if clsname is None:
+            return d
+        return self._decoders[clsname](d)
+
+    def dumps(self, obj, **kwargs):
+        return json.dumps(obj, default=self.default, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return json.loads(s, object_hook=self.object_hook, **kwargs)
+
+
+# Usage
+if __name__ == '__main__':
+    class Point:
+        __slots__ = ('x', 'y')
+
+        def __init__(self, x, y):
+            self.x = x
+            self.y = y
+
+    class Stock:
+        _fields = ['name', 'shares', 'price']
+
+        def __init__(self, name, shares, price):
+            self.name = name
+            self.shares = shares
+            self.price = price
+
+    registry = SerializerRegistry()
+    registry.register(Point)
+    registry.register(Stock)
+
+    s = registry.dumps([Point(2, 3), Stock('ACME', 100, 490.1)])
+    print(s)  # [{"__classname__": "Point", "x": 2, "y": 3}, {"__classname__": "Stock", ...}]
+    p, stock = registry.loads(s)
+    print(p.x, p.y, stock.name)
+
+    # Classes with a __dict__ need their fields listed
+    class Pair:
+        def __init__(self, a, b):
+            self.a = a
+            self.b = b
+
+    compact = SerializerRegistry(compact=True)
+    compact.register(Point)
+    compact.register(Pair, fields=['a', 'b'])
+    s = compact.dumps([Point(2, 3), Pair(1, 'x')])
+    print(s)  # [{"__Point__": [2, 3]}, {"__Pair__": [1, "x"]}]
+
+    # Benchmark against the recipe from reading_and_writing_json.py
+    from timeit import timeit
+
+    class PlainPoint:
+        def __init__(self, x, y):
+            self.x = x
+            self.y = y
+
+    def serialize_instance(obj):
+        d = {'__classname__': type(obj).__name__}
+        d.update(vars(obj))
+        return d
+
+    classes = {'PlainPoint': PlainPoint}
+
+    def unserialize_object(d):
+        clsname = d.pop('__classname__', None)
+        if clsname:
+            cls = classes[clsname]
+            obj = cls.__new__(cls)
+            for key, value in d.items():
+                setattr(obj, key, value)
+            return obj
+        else:
+            return d
+
+    plain_points = [PlainPoint(n, n * 2) for n in range(100000)]
+    plain_registry = SerializerRegistry()
+    plain_registry.register(PlainPoint, fields=['x', 'y'])
+    compact_registry = SerializerRegistry(compact=True)
+    compact_registry.register(PlainPoint, fields=['x', 'y'])
+
+    reflect_s = json.dumps(plain_points, default=serialize_instance)
+    compiled_s = plain_registry.dumps(plain_points)
+    compact_s = compact_registry.dumps(plain_points)
+    print('encode reflection', timeit(lambda: json.dumps(plain_points, default=serialize_instance), number=5))
+    print('encode compiled  ', timeit(lambda: plain_registry.dumps(plain_points), number=5))
+    print('encode compact   ', timeit(lambda: compact_registry.dumps(plain_points), number=5))
+    print('decode reflection', timeit(lambda: json.loads(reflect_s, object_hook=unserialize_object), number=5))
+    print('decode compiled  ', timeit(lambda: plain_registry.loads(compiled_s), number=5))
+    print('decode compact   ', timeit(lambda: compact_registry.loads(compact_s), number=5))
+    print('size', len(reflect_s), len(compiled_s), len(compact_s))
+
+"""
+The generated code is no different from what you would write by hand for
+a single class - for Point the encoder is just
+    return {"__classname__": "Point", "x": obj.x, "y": obj.y}
+and the decoder assigns all the attributes with a single tuple unpacking.
+No dict of attributes is built from vars() and there is no setattr() loop.
+
+The compact form drops the field names from every object, which saves both
+encoding time and bytes on the wire, at the cost of needing both sides to
+agree on the order of the fields.
+
+A namedtuple can not be handled this way even though it has _fields - the
+json module encodes any tuple as a JSON array without ever calling default.
+
+Note that the benchmark uses a corrected unserialize_object() - the version in
+reading_and_writing_json.py returns from inside the loop after setting only
+the first attribute.
+"""
@@ -0,0 +1,183 @@
+"""
+This script shows how to decode the points of the polygon file from
+reading_nested_variable_sized_binary_structures.py all at once, rather than
+one tuple per point with iter_as().
+
+When every field of a record has the same type - as with '<dd' points - the
+record's buffer is really just an array of doubles. It can be turned into a
+NumPy array (a view, no copying) or, without NumPy, into an array('d') with
+a single call. Bounding boxes and point counts can then be worked out over
+whole blocks of the file without creating any Python tuples.
+"""
+import struct
+import sys
+from array import array
+from itertools import chain
+
+from indexing_nested_variable_sized_binary_structures import PolygonFile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_header_struct = struct.Struct("<iddddi")
+_size_struct = struct.Struct("<i")
+
+# struct codes that can be decoded in bulk, with the matching array typecodes
+_TYPECODES = {'b': 'b', 'B': 'B', 'h': 'h', 'H': 'H', 'i': 'i', 'I': 'I',
+              'q': 'q', 'Q': 'Q', 'f': 'f', 'd': 'd'}
+
+
+def parse_homogeneous(code):
+    """
+    Split a struct code made of a single type, such as '<dd' or '<3i',
+    into (byte order, type code, number of fields)
+    """
+    byte_order = '='
+    if code[:1] in ('<', '>', '!', '=', '@'):
+        byte_order = '>' if code[0] == '!' else code[0]
+        code = code[1:]
+    digits = len(code) - len(code.lstrip('0123456789'))
+    count, types = code[:digits], code[digits:]
+    if not types or len(set(types)) != 1 or types[0] not in _TYPECODES or (count and len(types) != 1):
+        raise ValueError('Not a single-type struct code: {!r}'.format(code))
+    return byte_order, types[0], int(count) if count else len(types)
+
+
+def _little_endian(values):
+    # The polygon file is little endian, array.array is native
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def buffer_as_array(buf, code):
+    """
+    Decode a buffer holding a run of single-type structures.
+
+    With NumPy this is a (records, fields) shaped view of the buffer.
+    Otherwise it is a flat array.array holding a copy of the values.
+    """
+    byte_order, typecode, nfields = parse_homogeneous(code)
+    if np is not None:
+        dtype = np.dtype(typecode).newbyteorder('=' if byte_order == '@' else byte_order)
+        return np.frombuffer(buf, dtype=dtype).reshape(-1, nfields)
+    values = array(_TYPECODES[typecode])
+    values.frombytes(buf)
+    if (byte_order == '<' and sys.byteorder == 'big') or (byte_order == '>' and sys.byteorder == 'little'):
+        values.byteswap()
+    return values
+
+
+def record_as_array(record, code):
+    """
+    Bulk version of SizedRecord.iter_as(code) for single-type codes
+    """
+    return buffer_as_array(record._buffer, code)
+
+
+def _block_bounds(pf, first, last):
+    """
+    Return (num_points, (min_x, min_y), (max_x, max_y)) for polygons first to last
+    """
+    offsets = pf.offsets
+    start = offsets[first]
+    block = pf.buffer[start:offsets[last]]
+    if np is not None:
+        # One view over the whole block, with the size fields masked out
+        raw = np.frombuffer(block, dtype=np.uint8)
+        keep = np.ones(len(raw), dtype=bool)
+        size_fields = np.frombuffer(offsets, dtype=np.int64)[first:last] - start
+        keep[(size_fields[:, None] + np.arange(_size_struct.size)).ravel()] = False
+        points = raw[keep].view('<f8').reshape(-1, 2)
+        if not len(points):
+            return 0, None, None
+        return len(points), points.min(axis=0), points.max(axis=0)
+
+    values = array('d')
+    for n in range(first, last):
+        values.frombytes(block[offsets[n] - start + _size_struct.size:offsets[n + 1] - start])
+    _little_endian(values)
+    if not values:
+        return 0, None, None
+    xs, ys = values[0::2], values[1::2]
+    return len(xs), (min(xs), min(ys)), (max(xs), max(ys))
+
+
+def polygon_bounds(filename, block_size=65536):
+    """
+    Return (num_points, min_x, min_y, max_x, max_y) over all of the
+    polygons in a file, block_size polygons at a time.
+    """
+    num_points = 0
+    min_x = min_y = float('inf')
+    max_x = max_y = float('-inf')
+    with PolygonFile(filename) as pf:
+        for first in range(0, len(pf), block_size):
+            last = min(first + block_size, len(pf))
+            count, mins, maxs = _block_bounds(pf, first, last)
+            if count:
+                num_points += count
+                min_x, min_y = min(min_x, float(mins[0])), min(min_y, float(mins[1]))
+                max_x, max_y = max(max_x, float(maxs[0])), max(max_y, float(maxs[1]))
+    return num_points, min_x, min_y, max_x, max_y
+
+
+def write_polys(filename, polys):
+    """
+    Same output as write_polys() in reading_nested_variable_sized_binary_structures.py,
+    but each polygon is encoded with a single call and the bounding box is
+    found in one vectorised pass over all the points.
+    """
+    encoded = [_little_endian(array('d', chain.from_iterable(poly))) for poly in polys]
+
+    if np is not None:
+        points = np.concatenate([np.frombuffer(v, dtype='<f8') for v in encoded]).reshape(-1, 2)
+        (min_x, min_y), (max_x, max_y) = points.min(axis=0), points.max(axis=0)
+    else:
+        values = array('d')
+        for v in encoded:
+            values.extend(v)
+        _little_endian(values)
+        xs, ys = values[0::2], values[1::2]
+        min_x, min_y, max_x, max_y = min(xs), min(ys), max(xs), max(ys)
+
+    with open(filename, 'wb') as f:
+        f.write(_header_struct.pack(0x1234, min_x, min_y, max_x, max_y, len(encoded)))
+        for values in encoded:
+            f.write(_size_struct.pack(len(values) * values.itemsize + _size_struct.size))
+            f.write(values)
+
+
+# Usage
+if __name__ == '__main__':
+    polys = [
+        [(1.0, 2.5), (3.5, 4.0), (2.5, 1.5)],
+        [(7.0, 1.2), (5.1, 3.0), (0.5, 7.5), (0.8, 9.0)],
+        [(3.4, 6.3), (1.2, 0.5), (4.6, 9.2)],
+    ]
+    write_polys('polys.bin', polys)
+
+    with PolygonFile('polys.bin') as pf:
+        points = record_as_array(pf[1], '<dd')
+        print(points)  # [[7.  1.2] [5.1 3. ] [0.5 7.5] [0.8 9. ]]
+        del points
+
+    print(polygon_bounds('polys.bin'))  # (10, 0.5, 0.5, 7.0, 9.2)
+
+"""
+np.frombuffer() on a memoryview does not copy anything - the returned array
+reads straight from the memory map - so decoding a polygon with a million
+points costs about the same as decoding one with three.
+
+polygon_bounds() goes a step further and looks at blocks of many polygons at
+once. Within a block the points of consecutive polygons are only separated by
+their 4 byte size fields, so masking those out leaves a single array of doubles
+to take the minimum and maximum of. Without NumPy the points of a block are
+gathered into one array('d') and min()/max() run over its strided slices, which
+still avoids a tuple per point.
+
+As with any view of the memory map, arrays returned by record_as_array() must
+be released before the PolygonFile is closed.
+"""
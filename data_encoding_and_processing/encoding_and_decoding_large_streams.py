@@ -0,0 +1,207 @@
+"""
+This script shows how to base64 or hex encode and decode data that is too
+large to hold in memory, such as multi gigabyte attachments.
+
+decoding_encoding_base64.py and decoding_encoding_hex.py encode a whole byte
+string at once, so both the input and the output have to fit in memory. Both
+encodings work on fixed size groups though - 3 bytes become 4 base64
+characters and 1 byte becomes 2 hex digits - so data can be encoded a chunk at
+a time as long as each chunk (other than the last) is a whole number of groups.
+"""
+import binascii
+import io
+
+# codec name: (input group size, output group size, encode, decode)
+CODECS = {
+    'base64': (3, 4, lambda data: binascii.b2a_base64(data, newline=False), binascii.a2b_base64),
+    'hex': (1, 2, binascii.b2a_hex, binascii.a2b_hex),
+}
+
+CHUNK_SIZE = 3 * 4 * 19 * 1024     # A multiple of both the base64 group and a 76 char line
+_WHITESPACE = b' \t\r\n'
+
+
+def _codec(codec, line_length=None):
+    in_size, out_size, encode, decode = CODECS[codec]
+    if line_length:
+        if line_length % out_size:
+            raise ValueError('line_length must be a multiple of {}'.format(out_size))
+        # Encode a whole number of lines at a time
+        in_size = line_length // out_size * in_size
+    return in_size, encode, decode
+
+
+def _wrap(encoded, line_length):
+    if not line_length:
+        return encoded
+    return b''.join(encoded[i:i + line_length] + b'\n' for i in range(0, len(encoded), line_length))
+
+
+def encode_chunks(chunks, codec='base64', line_length=None):
+    """
+    Generator stage - encode an iterable of byte chunks of any size,
+    optionally wrapping the output into lines of line_length characters
+    """
+    in_size, encode, _ = _codec(codec, line_length)
+    carry = b''
+    for chunk in chunks:
+        if carry:
+            chunk = carry + chunk
+        cut = len(chunk) - len(chunk) % in_size
+        carry = chunk[cut:]
+        if cut:
+            yield _wrap(encode(memoryview(chunk)[:cut]), line_length)
+    if carry:
+        yield _wrap(encode(carry), line_length)
+
+
+def decode_chunks(chunks, codec='base64'):
+    """
+    Generator stage - decode an iterable of encoded chunks of any size.
+    Line breaks and other whitespace are ignored.
+    """
+    in_size, out_size, _, decode = CODECS[codec]
+    carry = b''
+    for chunk in chunks:
+        chunk = carry + bytes(chunk).translate(None, _WHITESPACE)
+        cut = len(chunk) - len(chunk) % out_size
+        carry = chunk[cut:]
+        if cut:
+            yield decode(chunk[:cut])
+    if carry:
+        # Raises binascii.Error for truncated input
+        yield decode(carry)
+
+
+def copy_encoded(src, dst, codec='base64', line_length=None, chunk_size=CHUNK_SIZE):
+    """
+    Encode everything from the binary file src into the binary file dst.
+    Input is read into a single preallocated buffer which is reused for every chunk.
+    """
+    in_size, encode, _ = _codec(codec, line_length)
+    # A whole number of groups (of lines, when wrapping), and at least one
+    chunk_size = max(chunk_size - chunk_size % in_size, in_size)
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    pending = 0
+    while True:
+        n = src.readinto(view[pending:])
+        if not n:
+            break
+        pending += n
+        if pending == chunk_size:
+            dst.write(_wrap(encode(view), line_length))
+            pending = 0
+    if pending:
+        dst.write(_wrap(encode(view[:pending]), line_length))
+
+
+def copy_decoded(src, dst, codec='base64', chunk_size=CHUNK_SIZE):
+    """
+    Decode everything from the binary file src into the binary file dst
+    """
+    for data in decode_chunks(iter(lambda: src.read(chunk_size), b''), codec):
+        dst.write(data)
+
+
+class EncodingWriter(io.RawIOBase):
+    """
+    A writable file that encodes everything written to it into another
+    binary file. close() must be called to write out the final group.
+    """
+
+    def __init__(self, f, codec='base64', line_length=None):
+        self._file = f
+        self._line_length = line_length
+        self._in_size, self._encode, _ = _codec(codec, line_length)
+        self._carry = b''
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        nbytes = len(data)
+        if self._carry:
+            data = self._carry + bytes(data)
+        cut = len(data) - len(data) % self._in_size
+        self._carry = bytes(data[cut:])
+        if cut:
+            self._file.write(_wrap(self._encode(memoryview(data)[:cut]), self._line_length))
+        return nbytes
+
+    def close(self):
+        if not self.closed:
+            if self._carry:
+                self._file.write(_wrap(self._encode(self._carry), self._line_length))
+                self._carry = b''
+            self._file.flush()
+        super().close()
+
+
+class DecodingReader(io.RawIOBase):
+    """
+    A readable file that decodes the contents of another binary file.
+    Wrap it in io.BufferedReader() for efficient small reads.
+    """
+
+    def __init__(self, f, codec='base64', chunk_size=CHUNK_SIZE):
+        self._chunks = decode_chunks(iter(lambda: f.read(chunk_size), b''), codec)
+        self._pending = b''
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._pos == len(self._pending):
+            self._pending = next(self._chunks, None)
+            self._pos = 0
+            if self._pending is None:
+                self._pending = b''
+                return 0
+        n = min(len(b), len(self._pending) - self._pos)
+        b[:n] = memoryview(self._pending)[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+# Usage
+if __name__ == '__main__':
+    import base64
+
+    data = bytes(range(256)) * 1000
+
+    # Generator stages
+    encoded = b''.join(encode_chunks([data[:1000], data[1000:1001], data[1001:]], line_length=76))
+    assert encoded == base64.encodebytes(data)
+    assert b''.join(decode_chunks([encoded[:77], encoded[77:]])) == data
+
+    # File to file
+    src = io.BytesIO(data)
+    dst = io.BytesIO()
+    copy_encoded(src, dst, 'hex')
+    assert dst.getvalue() == binascii.b2a_hex(data)
+
+    # File-like objects
+    out = io.BytesIO()
+    with EncodingWriter(out, line_length=76) as f:
+        f.write(data)
+    reader = io.BufferedReader(DecodingReader(io.BytesIO(out.getvalue())))
+    assert reader.read(10) == data[:10]
+    assert reader.read() == data[10:]
+
+"""
+The pieces fit together at the group boundaries - each chunk is cut at a
+multiple of 3 bytes (or, when wrapping, of a whole 57 byte line) and any bytes
+left over are carried to the front of the next chunk. Only the very last chunk
+gets = padding, so the output is identical to encoding everything at once.
+
+On the decoding side line breaks are stripped first, then input is cut at a
+multiple of 4 characters (2 for hex) in the same way.
+
+copy_encoded() reads into one bytearray with readinto() and passes memoryview
+slices of it to binascii, so the input side never allocates. The binascii
+functions always return a new bytes object for their output, which is simply
+written out and dropped, so memory use stays at about two chunks no matter how
+large the input.
+"""
@@ -0,0 +1,165 @@
+"""
+This script shows how to pull a handful of fields out of a huge xml
+document without building any Element objects at all.
+
+parse_and_remove() in parsing_huge_xml_files_incrementally.py compares
+the whole tag stack against the path on every end event and yields full
+Elements, which are then immediately reduced to a single value with
+findtext(). When records are wide most of the time goes on list
+comparisons and on building children that are thrown away.
+
+The alternative is to declare the record path and the fields you want
+up front, then drive the low level expat parser directly with a small
+state machine that tracks how much of the path has been matched so far.
+"""
+from xml.parsers import expat
+from collections import Counter, namedtuple
+
+CHUNK_SIZE = 1 << 16
+
+
+class RecordExtractor:
+    """
+    Extracts fields from every record matching path (relative to the root
+    element, like parse_and_remove()).
+
+    Fields name direct children of the record, whose text is extracted the
+    way findtext() does - the first such child, up to any element inside it.
+    A name starting with @ extracts an attribute of the record instead.
+    Records are produced as tuples, or as dicts if as_dict is set.
+    Fields missing from a record are returned as None.
+    """
+
+    def __init__(self, path, fields, as_dict=False):
+        self.path_parts = tuple(path.split('/'))
+        self.fields = tuple(fields)
+        self.as_dict = as_dict
+        self._children = {name: n for n, name in enumerate(self.fields)
+                          if not name.startswith('@')}
+        self._attrs = [(n, name[1:]) for n, name in enumerate(self.fields)
+                       if name.startswith('@')]
+
+    def iterparse(self, source):
+        """
+        Generate the records found in source, a filename or a binary file
+        """
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                yield from self._iterparse(f)
+        else:
+            yield from self._iterparse(source)
+
+    __call__ = iterparse
+
+    def _iterparse(self, f):
+        path_parts = self.path_parts
+        nparts = len(path_parts)
+        # The root element sits at depth 1
+        record_depth = nparts + 1
+        field_depth = record_depth + 1
+        children = self._children
+        attr_fields = self._attrs
+        nfields = len(self.fields)
+        fields = self.fields
+        as_dict = self.as_dict
+
+        records = []
+        # Parser state - kept in a list so the handlers can update it
+        # depth, number of path parts matched, current record values, current field index
+        state = [0, 0, None, None]
+        text = []
+
+        def start(tag, attrs):
+            depth = state[0] = state[0] + 1
+            values = state[2]
+            if values is not None:
+                if depth == field_depth:
+                    # Like findtext(), only the first occurrence of a field counts
+                    n = children.get(tag)
+                    state[3] = n if n is not None and values[n] is None else None
+                    del text[:]
+                elif state[3] is not None:
+                    # A child nested in the field ends its text, as with Element.text
+                    values[state[3]] = ''.join(text)
+                    state[3] = None
+            else:
+                matched = state[1]
+                if depth == matched + 2 and matched < nparts and tag == path_parts[matched]:
+                    matched = state[1] = matched + 1
+                    if matched == nparts:
+                        values = state[2] = [None] * nfields
+                        for n, name in attr_fields:
+                            values[n] = attrs.get(name)
+
+        def end(tag):
+            depth = state[0]
+            values = state[2]
+            if values is not None:
+                if depth == field_depth:
+                    if state[3] is not None:
+                        values[state[3]] = ''.join(text)
+                        state[3] = None
+                elif depth == record_depth:
+                    records.append(dict(zip(fields, values)) if as_dict else tuple(values))
+                    state[2] = None
+                    state[1] -= 1
+            elif depth == state[1] + 1 and state[1] > 0:
+                state[1] -= 1
+            state[0] = depth - 1
+
+        def chardata(data):
+            # Only the text of the field itself, not of anything nested inside it
+            if state[3] is not None and state[0] == field_depth:
+                text.append(data)
+
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = chardata
+
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            parser.Parse(chunk, False)
+            # Hand over whatever records were completed by this chunk
+            if records:
+                yield from records
+                del records[:]
+        parser.Parse(b'', True)
+        yield from records
+
+
+def compile_extractor(path, fields, as_dict=False):
+    return RecordExtractor(path, fields, as_dict)
+
+
+# Usage
+if __name__ == '__main__':
+    potholes_by_zip = Counter()
+
+    extract_zips = compile_extractor('row/row', ['zip'])
+    for zipcode, in extract_zips('potholes.xml'):
+        potholes_by_zip[zipcode] += 1
+
+    for zipcode, num in potholes_by_zip.most_common():
+        print(zipcode, num)
+
+    # Several fields - combine with namedtuple to access them by name
+    Pothole = namedtuple('Pothole', ['id', 'zip', 'street_address'])
+    extract_potholes = compile_extractor('row/row', ['@_id', 'zip', 'street_address'])
+    for pothole in map(Pothole._make, extract_potholes('potholes.xml')):
+        print(pothole.id, pothole.zip, pothole.street_address)
+
+"""
+The path is matched one tag at a time as start events arrive. A start tag
+can only advance the match if it sits directly below the last matched
+element, and an end tag at that depth steps the match back again. So each
+event costs an integer comparison rather than a comparison of two lists.
+
+Because expat calls back with plain strings, no Element is ever created -
+only the requested values are kept and everything else is discarded as soon
+as the parser has moved past it. Setting buffer_text stops expat from
+splitting text into several callbacks.
+
+As with findtext(), only the text directly inside a field element is
+extracted; text belonging to elements nested within it is ignored.
+"""
@@ -0,0 +1,170 @@
+"""
+This script shows how to get at any record of a file of variable sized
+binary records directly, without reading through all the records before it.
+
+read_polys() in reading_nested_variable_sized_binary_structures.py walks the
+polygon file from the start. Since each record starts with its size, a single
+pass that only reads the sizes is enough to find where every record begins.
+Those offsets are saved in an index file next to the data, after which
+polygon N is found with one lookup and overlaid on a memory mapped copy of
+the file using a memoryview slice - the same zero-copy idea SizedRecord
+already relies on.
+"""
+import mmap
+import os
+import struct
+from array import array
+
+from reading_nested_variable_sized_binary_structures import Point, PolyHeader, SizedRecord, write_polys
+
+# Index file layout: magic, size and mtime of the data file, then the offsets
+_index_header = struct.Struct("<4sqq")
+_INDEX_MAGIC = b"PIDX"
+_size_struct = struct.Struct("<i")
+
+
+def scan_offsets(buf, header_size, num_records):
+    """
+    Return an array of num_records + 1 offsets - the start of each record's
+    size field, followed by the end of the last record.
+    """
+    offsets = array("q", [0]) * (num_records + 1)
+    unpack_from = _size_struct.unpack_from
+    pos = header_size
+    for n in range(num_records):
+        offsets[n] = pos
+        # The size includes the size field itself
+        (size,) = unpack_from(buf, pos)
+        pos += size
+    offsets[num_records] = pos
+    return offsets
+
+
+def _stamp(filename):
+    st = os.stat(filename)
+    return st.st_size, st.st_mtime_ns
+
+
+def load_index(index_filename, filename):
+    """
+    Load a saved index, returning None if it is missing or out of date
+    """
+    try:
+        with open(index_filename, "rb") as f:
+            magic, size, mtime = _index_header.unpack(f.read(_index_header.size))
+            if magic != _INDEX_MAGIC or (size, mtime) != _stamp(filename):
+                return None
+            offsets = array("q")
+            offsets.frombytes(f.read())
+    except (OSError, struct.error):
+        return None
+    return offsets
+
+
+def save_index(index_filename, filename, offsets):
+    with open(index_filename, "wb") as f:
+        f.write(_index_header.pack(_INDEX_MAGIC, *_stamp(filename)))
+        offsets.tofile(f)
+
+
+class PolygonFile:
+    """
+    Random access to the polygons in a file written by write_polys().
+
+    The index is kept in filename + '.idx' and is rebuilt whenever the
+    data file has changed since it was written.
+    """
+
+    def __init__(self, filename, index_filename=None):
+        self.filename = filename
+        self.index_filename = index_filename or filename + ".idx"
+        self._file = open(filename, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        self.header = PolyHeader(self._buffer[: PolyHeader.struct_size])
+
+        offsets = load_index(self.index_filename, filename)
+        if offsets is None or len(offsets) != self.header.num_polys + 1:
+            offsets = scan_offsets(self._buffer, PolyHeader.struct_size, self.header.num_polys)
+            try:
+                save_index(self.index_filename, filename, offsets)
+            except OSError:
+                # Such as a read-only directory - the index is only a cache,
+                # so carry on with the offsets just built
+                pass
+        self._offsets = offsets
+
+    @property
+    def offsets(self):
+        # Record n occupies offsets[n] to offsets[n + 1], including its size field
+        return self._offsets
+
+    @property
+    def buffer(self):
+        return self._buffer
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, n):
+        if n < 0:
+            n += len(self)
+        if not 0 <= n < len(self):
+            raise IndexError("polygon index out of range")
+        start = self._offsets[n] + _size_struct.size
+        return SizedRecord(self._buffer[start : self._offsets[n + 1]])
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield self[n]
+
+    def close(self):
+        # Records handed out still refer to the mapping, so they must be
+        # released before it can be closed
+        self.header = None
+        self._buffer.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_ty, exc_val, tb):
+        self.close()
+
+
+# Usage
+if __name__ == "__main__":
+    polys = [
+        [(1.0, 2.5), (3.5, 4.0), (2.5, 1.5)],
+        [(7.0, 1.2), (5.1, 3.0), (0.5, 7.5), (0.8, 9.0)],
+        [(3.4, 6.3), (1.2, 0.5), (4.6, 9.2)],
+    ]
+    write_polys("polys.bin", polys)
+
+    with PolygonFile("polys.bin") as pf:
+        print(len(pf), pf.header.num_polys)
+        poly = pf[1]
+        for p in poly.iter_as(Point):
+            print(p.x, p.y)
+        print(list(pf[-1].iter_as("<dd")))
+        del poly, p
+
+"""
+Building the index only touches the 4 byte size at the start of each record,
+and doing it over the memory map means no read() calls and no copies - pages
+holding nothing but points are skipped over entirely by the operating system.
+
+The offsets are kept in an array('q') which is written to and read from the
+index file in a single call, so reopening a file with millions of polygons
+costs about as much as reading 8 bytes per polygon. Storing the size and
+modification time of the data file alongside means a stale index is noticed
+and rebuilt rather than silently returning the wrong data. If the index can
+not be written, the file is still opened with the offsets held in memory -
+they just have to be found again next time.
+
+pf[n] is a SizedRecord over a slice of the memoryview of the map, so its
+iter_as() method works exactly as before. As with any memoryview of an mmap,
+the map cannot be closed while such records are still alive - release them
+before calling close().
+"""
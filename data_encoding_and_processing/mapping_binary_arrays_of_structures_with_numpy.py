@@ -0,0 +1,163 @@
+"""
+This script shows how to read and write a binary array of uniform structures
+as a NumPy structured array, instead of unpacking it into one tuple per record.
+
+read_records() and unpack_records() in reading_and_writing_binary_arrays_of_structures.py
+decode each record with Struct.unpack_from(). That is fine for a few thousand
+records but with hundreds of millions most of the time goes on creating tuples.
+
+A struct format code such as '<idd' can be translated into an equivalent NumPy
+structured dtype. The file can then be viewed as an array of that dtype, either
+over bytes already in memory (np.frombuffer) or directly over the file (np.memmap),
+and each field accessed as a column without decoding anything up front.
+"""
+import re
+import struct
+import numpy as np
+
+# struct codes with a standard size and their NumPy equivalents
+_STANDARD_CODES = {
+    'c': 'S1', 'b': 'i1', 'B': 'u1', '?': 'b1',
+    'h': 'i2', 'H': 'u2', 'i': 'i4', 'I': 'u4', 'l': 'i4', 'L': 'u4',
+    'q': 'i8', 'Q': 'u8', 'e': 'f2', 'f': 'f4', 'd': 'f8',
+}
+
+# With native ('@') byte order sizes and alignment follow the C compiler
+_NATIVE_CODES = {
+    'c': 'S1', 'b': 'b', 'B': 'B', '?': '?',
+    'h': 'h', 'H': 'H', 'i': 'i', 'I': 'I', 'l': 'l', 'L': 'L',
+    'q': 'q', 'Q': 'Q', 'n': 'n', 'N': 'N', 'e': 'e', 'f': 'f', 'd': 'd',
+}
+
+_BYTE_ORDERS = {'<': '<', '>': '>', '!': '>', '=': '=', '@': '='}
+
+_token = re.compile(r'\s*(\d*)([a-zA-Z?])')
+
+
+def struct_to_dtype(format, names=None):
+    """
+    Build a NumPy structured dtype with the same layout as a struct format code.
+
+    names gives the field names, otherwise they are f0, f1, ... Padding bytes (x)
+    do not get a field. Repeat counts make a field an array, except for s
+    where the count is the length of the byte string.
+    """
+    byte_order = '@'
+    if format and format[0] in _BYTE_ORDERS:
+        byte_order = format[0]
+        format = format[1:]
+    native = byte_order == '@'
+    prefix = '' if native else _BYTE_ORDERS[byte_order]
+    codes = _NATIVE_CODES if native else _STANDARD_CODES
+
+    fields = []
+    pos = 0
+    for m in _token.finditer(format):
+        if m.start() != pos:
+            break
+        pos = m.end()
+        count, code = m.groups()
+        count = int(count) if count else 1
+        if code == 'x':
+            fields.append((None, 'V{}'.format(count), 1))
+        elif code in ('s', 'p'):
+            fields.append(('', 'S{}'.format(count), 1))
+        elif code in codes:
+            fields.append(('', prefix + codes[code], count))
+        else:
+            raise ValueError('Unsupported struct code {!r}'.format(code))
+    if format[pos:].strip():
+        raise ValueError('Bad struct format {!r}'.format(format[pos:]))
+
+    named = [f for f in fields if f[0] is not None]
+    if names is None:
+        names = ['f{}'.format(n) for n in range(len(named))]
+    if len(names) != len(named):
+        raise ValueError('Expected {} field names, got {}'.format(len(named), len(names)))
+
+    descr = []
+    names = iter(names)
+    padding = 0
+    for name, code, count in fields:
+        if name is None:
+            # Unnamed padding - give it a private name so the offsets stay right
+            padding += 1
+            descr.append(('_pad{}'.format(padding), code))
+        elif count == 1:
+            descr.append((next(names), code))
+        else:
+            descr.append((next(names), code, (count,)))
+    dtype = np.dtype(descr, align=native)
+
+    # Make sure the layout really is the same
+    size = struct.calcsize(('@' if native else byte_order) + format)
+    if dtype.itemsize != size:
+        # struct does not pad the end of a native structure, NumPy does
+        if native and dtype.itemsize > size:
+            dtype = np.dtype({'names': dtype.names,
+                              'formats': [dtype.fields[n][0] for n in dtype.names],
+                              'offsets': [dtype.fields[n][1] for n in dtype.names],
+                              'itemsize': size})
+        else:
+            raise ValueError('dtype size {} does not match struct size {}'.format(dtype.itemsize, size))
+    return dtype
+
+
+def unpack_records_array(format, data, names=None):
+    """
+    View bytes (or any buffer) holding the records as a structured array - no copy is made
+    """
+    return np.frombuffer(data, dtype=struct_to_dtype(format, names))
+
+
+def read_records_array(format, filename, names=None, mode='r'):
+    """
+    Map a file of records as a structured array. Pages are only read from disk
+    when the corresponding records are touched.
+    """
+    return np.memmap(filename, dtype=struct_to_dtype(format, names), mode=mode)
+
+
+def write_records_array(records, f):
+    """
+    Write a structured array of records to a binary file in one write
+    """
+    f.write(np.ascontiguousarray(records).data)
+
+
+# Usage example
+if __name__ == '__main__':
+    records = [(1, 2.3, 4.5),
+               (6, 7.8, 9.0),
+               (12, 13.4, 56.7)]
+
+    dtype = struct_to_dtype('<idd', ['kind', 'x', 'y'])
+    print(dtype)  # [('kind', '<i4'), ('x', '<f8'), ('y', '<f8')]
+
+    with open('data.b', 'wb') as f:
+        write_records_array(np.array(records, dtype=dtype), f)
+
+    recs = read_records_array('<idd', 'data.b', ['kind', 'x', 'y'])
+    print(recs['x'])  # [ 2.3  7.8 13.4]
+    print(recs['x'].sum(), recs[recs['kind'] > 5]['y'])
+
+    with open('data.b', 'rb') as f:
+        data = f.read()
+    recs = unpack_records_array('<idd', data, ['kind', 'x', 'y'])
+    print(recs[1])  # (6, 7.8, 9.)
+
+"""
+Each struct code maps onto a NumPy type of the same size, and the byte order
+prefix (<, > or !) is applied to every field just as struct does. With native
+byte order ('@' or no prefix) struct aligns fields the way a C compiler would;
+align=True makes NumPy do the same. struct_to_dtype() checks the resulting
+itemsize against struct.calcsize() so a mismatch is caught straight away.
+
+Slicing a field such as recs['x'] gives a strided view rather than a copy, and
+arithmetic on it runs over the whole column in C. With np.memmap the file is not
+even read until a page is needed, so opening a file of 500 million records
+is instant.
+
+When writing, the array's own memory is handed to write() through its buffer,
+so everything goes out in a single call without making a bytes copy.
+"""
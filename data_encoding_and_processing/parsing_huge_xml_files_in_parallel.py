@@ -0,0 +1,226 @@
+"""
+This script shows how to extract data from a huge xml document
+using several processes while keeping the small memory footprint of
+the incremental approach.
+
+parse_and_remove() in parsing_huge_xml_files_incrementally.py uses as
+little memory as possible but only a single core, and runs about twice
+as slow as parse(). If the records you are interested in are repeated
+siblings (such as row/row in the city data dumps), the file can be cut
+into byte ranges at record boundaries and each range parsed
+incrementally in its own process. The partial results (such as a Counter)
+are then merged together.
+
+Use data from:
+https://data.cityofchicago.org/api/views/7as2-ds3y/rows.xml?accessType=DOWNLOAD
+"""
+from xml.etree.ElementTree import XMLPullParser
+from xml.parsers import expat
+from collections import Counter
+from functools import reduce
+import multiprocessing
+import operator
+import os
+import re
+
+CHUNK_SIZE = 1 << 16
+
+
+class _FoundRecord(Exception):
+    pass
+
+
+def find_data_start(filename, path):
+    """
+    Return the byte offset of the first record matching path
+    (relative to the root element, like parse_and_remove())
+    """
+    path_parts = path.split('/')
+    tag_stack = []
+    parser = expat.ParserCreate()
+
+    def start(tag, attrs):
+        tag_stack.append(tag)
+        # tag_stack[0] is the root element
+        if tag_stack[1:] == path_parts:
+            raise _FoundRecord(parser.CurrentByteIndex)
+
+    def end(tag):
+        tag_stack.pop()
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    with open(filename, 'rb') as f:
+        try:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                parser.Parse(chunk, False)
+        except _FoundRecord as e:
+            return e.args[0]
+    raise ValueError('No records matching {!r} in {}'.format(path, filename))
+
+
+def find_data_end(filename, path):
+    """
+    Return the byte offset just past the last record.
+
+    The last record is assumed to be followed only by the closing tags of
+    its ancestors - one per path component plus one for the root.
+    """
+    ncloses = len(path.split('/'))
+    trailer = re.compile(rb'(?:\s*</[^<>]+>){%d}\s*\Z' % ncloses)
+    size = os.path.getsize(filename)
+    tail_size = CHUNK_SIZE
+    with open(filename, 'rb') as f:
+        while True:
+            offset = max(0, size - tail_size)
+            f.seek(offset)
+            m = trailer.search(f.read())
+            if m:
+                return offset + m.start()
+            if offset == 0:
+                raise ValueError('Unexpected trailer in {}'.format(filename))
+            tail_size *= 2
+
+
+def find_record_start(f, tag, offset, limit):
+    """
+    Return the offset of the first <tag ...> at or after offset (or limit
+    if there is none). Assumes that records are not nested inside
+    one another, which is true of row/row style dumps.
+    """
+    pattern = re.compile(rb'<' + re.escape(tag.encode('utf-8')) + rb'[\s/>]')
+    overlap = len(tag) + 1
+    f.seek(offset)
+    while offset < limit:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        m = pattern.search(chunk)
+        if m:
+            return min(offset + m.start(), limit)
+        if len(chunk) <= overlap:
+            break
+        # Step back a little in case a tag straddles the two chunks
+        offset += len(chunk) - overlap
+        f.seek(offset)
+    return limit
+
+
+def split_records(filename, path, nshards):
+    """
+    Split the records of the file into at most nshards (start, end)
+    byte ranges, each of which begins on a record boundary.
+    """
+    tag = path.split('/')[-1]
+    data_start = find_data_start(filename, path)
+    data_end = find_data_end(filename, path)
+    step = max(1, (data_end - data_start) // nshards)
+    boundaries = [data_start]
+    with open(filename, 'rb') as f:
+        for n in range(1, nshards):
+            target = max(data_start + n * step, boundaries[-1])
+            start = find_record_start(f, tag, target, data_end)
+            if start > boundaries[-1]:
+                boundaries.append(start)
+    boundaries.append(data_end)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def _read_declaration(filename):
+    # Shards are parsed without the file prologue - carry the xml declaration
+    # over so that a non utf-8 encoding is still honoured
+    with open(filename, 'rb') as f:
+        head = f.read(256)
+    m = re.match(rb'<\?xml[^>]*\?>', head)
+    return m.group(0) if m else b''
+
+
+def parse_shard(filename, start, end, tag, declaration=b''):
+    """
+    Incrementally parse the records in the byte range [start, end),
+    yielding each one and removing it once the consumer has finished with it.
+    """
+    parser = XMLPullParser(('start', 'end'))
+    parser.feed(declaration + b'<shard>')
+    depth = 0
+    root = None
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 1 and elem.tag == tag:
+                        yield elem
+                        # Same as parse_and_remove() - drop the yielded record
+                        root.remove(elem)
+    parser.feed(b'</shard>')
+    parser.close()
+
+
+def _reduce_shard(args):
+    filename, start, end, tag, declaration, reducer = args
+    return reducer(parse_shard(filename, start, end, tag, declaration))
+
+
+def parallel_parse_and_reduce(filename, path, reducer, combine=operator.add,
+                              initial=None, processes=None, nshards=None):
+    """
+    Apply reducer to the records of each shard in a process pool and
+    merge the partial results with combine, in file order.
+
+    reducer must be a module level function (so it can be pickled) taking
+    an iterable of elements and returning a partial result.
+    """
+    processes = processes or os.cpu_count() or 1
+    # A few more shards than processes evens out the work between them
+    nshards = nshards or processes * 4
+    tag = path.split('/')[-1]
+    declaration = _read_declaration(filename)
+    tasks = [(filename, start, end, tag, declaration, reducer)
+             for start, end in split_records(filename, path, nshards)]
+    if processes == 1:
+        results = map(_reduce_shard, tasks)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_reduce_shard, tasks)
+    if initial is not None:
+        return reduce(combine, results, initial)
+    return reduce(combine, results)
+
+
+# Reducers have to live at module level so they can be sent to the workers
+def count_by_zip(potholes):
+    return Counter(pothole.findtext('zip') for pothole in potholes)
+
+
+# Usage
+if __name__ == '__main__':
+    potholes_by_zip = parallel_parse_and_reduce('potholes.xml', 'row/row',
+                                                count_by_zip, initial=Counter())
+    for zipcode, num in potholes_by_zip.most_common():
+        print(zipcode, num)
+
+"""
+Each worker only ever holds a single record plus a 64KB read buffer, so the
+memory use per process stays close to that of parse_and_remove(). The cost
+of finding the boundaries is a couple of short reads per shard.
+
+The trick relies on the structure of the file. The split points are found by
+searching for the opening tag of a record, so records must not contain
+elements with the same tag, and the last record must be followed only by the
+closing tags of its parents. Both hold for the row/row city data dumps.
+
+Since results are combined in file order, combine does not have to be
+commutative - lists can be concatenated just as well as Counters added.
+"""
@@ -36,26 +36,28 @@ def parse_and_remove(filename, path):
                 pass
 
 # To test use a big data set
-potholes_by_zip = Counter()
+if __name__ == '__main__':
+    potholes_by_zip = Counter()
 
-doc = parse('potholes.xml')
-for pothole in doc.iterfind('row/row'):
-    potholes_by_zip[pothole.findtext('zip')] += 1
-for zipcode, num in potholes_by_zip.most_common():
-    print(zipcode, num)
+    doc = parse('potholes.xml')
+    for pothole in doc.iterfind('row/row'):
+        potholes_by_zip[pothole.findtext('zip')] += 1
+    for zipcode, num in potholes_by_zip.most_common():
+        print(zipcode, num)
 
 """
 Problem with this is that it reads and parses the entire XML file into 
 memory. Using the code above uses a memory footprint of 450MB the below uses just 7MB
 """
-pot_holes_by_zip = Counter()
+if __name__ == '__main__':
+    potholes_by_zip = Counter()
 
-data = parse_and_remove('potholes.xml', 'row/row')
-for pothole in data:
-    potholes_by_zip[pothole.findtext('zip')] += 1
+    data = parse_and_remove('potholes.xml', 'row/row')
+    for pothole in data:
+        potholes_by_zip[pothole.findtext('zip')] += 1
 
-for zipcode, num in potholes_by_zip.most_common():
-    print(zipcode, num)
+    for zipcode, num in potholes_by_zip.most_common():
+        print(zipcode, num)
 
 """
 Primary downside to this recipe is runtime performance. This version of code reads entire document into 
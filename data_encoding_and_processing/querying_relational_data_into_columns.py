@@ -0,0 +1,98 @@
+"""
+This script shows how to fetch the result of an sqlite3 query as typed
+columns instead of a list of tuples.
+
+For analytics queries that pull millions of rows only to add them up, a tuple
+per row (plus an object per value) costs more time and memory than the query
+itself. Given a declared schema, each batch of rows from fetchmany() can be
+transposed with zip(*rows) and appended to one array per column, in the same
+way as reading_csv_data_into_columns.py does for csv files.
+"""
+import operator
+import sqlite3
+from array import array
+
+from reading_csv_data_into_columns import to_numpy
+
+# SQL column types and the array typecode used to hold them.
+# Anything else (such as text) is kept in a plain list
+SQL_TYPECODES = {
+    'integer': 'q',
+    'int': 'q',
+    'real': 'd',
+    'float': 'd',
+    'double': 'd',
+}
+
+
+def parse_schema(schema):
+    """
+    Accept a declaration such as 'symbol text, shares integer, price real'
+    or a list of (name, type) pairs
+    """
+    if isinstance(schema, str):
+        # The type may be several words, such as 'double precision'
+        schema = [tuple(column.split(None, 1)) for column in schema.split(',')]
+    return [(name, ' '.join(sqltype.lower().split())) for name, sqltype in schema]
+
+
+def query_columns(db, sql, schema, params=(), batch_size=10000):
+    """
+    Run a query and return a dict mapping each column name of schema
+    to an array (or list) of its values
+    """
+    schema = parse_schema(schema)
+    typecodes = [SQL_TYPECODES.get(sqltype.split()[0]) for _, sqltype in schema]
+    columns = [array(typecode) if typecode else [] for typecode in typecodes]
+
+    c = db.cursor()
+    c.arraysize = batch_size
+    c.execute(sql, params)
+    if len(c.description) != len(schema):
+        raise ValueError('Query returns {} columns, schema has {}'.format(
+            len(c.description), len(schema)))
+    try:
+        while True:
+            rows = c.fetchmany()
+            if not rows:
+                break
+            for column, values in zip(columns, zip(*rows)):
+                column.extend(values)
+    finally:
+        c.close()
+    return {name: column for (name, _), column in zip(schema, columns)}
+
+
+# Usage
+if __name__ == '__main__':
+    db = sqlite3.connect(':memory:')
+    db.execute('create table portfolio (symbol text, shares integer, price real)')
+    db.executemany('insert into portfolio values (?,?,?)', [
+        ('GOOG', 100, 490.1),
+        ('FB', 150, 7.45),
+        ('APPL', 50, 545.75),
+        ('HPQ', 75, 33.2),
+    ])
+
+    cols = query_columns(db, 'select symbol, shares, price from portfolio',
+                         'symbol text, shares integer, price real')
+    print(cols['shares'])  # array('q', [100, 150, 50, 75])
+    print(cols['price'])   # array('d', [490.1, 7.45, 545.75, 33.2])
+
+    # Total value without a tuple per row
+    print(sum(map(operator.mul, cols['shares'], cols['price'])))
+
+    # Or with NumPy - to_numpy() wraps the arrays without copying
+    shares = to_numpy(cols['shares'])
+    price = to_numpy(cols['price'])
+    print((shares * price).sum())
+
+"""
+Each batch of rows is still built as tuples by sqlite3 itself, but only
+batch_size of them are alive at a time, and the values end up stored unboxed -
+8 bytes each in an array rather than a float object and a pointer in a tuple.
+
+Arrays can not hold None, so an integer or real column containing NULL raises a
+TypeError. Either filter them out in the query or replace them, for example
+with coalesce(price, 0).
+"""
@@ -68,11 +68,12 @@ i,d,f are structure codes
 
 An example of the pack and unpack method are shown below
 """
-record_struct = Struct('<idd')
-record_struct.size
-record_struct.pack(1, 2.0, 3.0)
-record_struct.unpack_from(_)
-# (1, 2.0, 3.0)
+if __name__ == '__main__':
+    record_struct = Struct('<idd')
+    record_struct.size
+    data = record_struct.pack(1, 2.0, 3.0)
+    record_struct.unpack_from(data)
+    # (1, 2.0, 3.0)
 
 """
 Code for reading binary structures involves some nice programming idioms.
@@ -80,11 +81,12 @@ read_records() function - iter() is used to make an iterator that returns
 fixed size chunks - this calls a user supplied callable 
 until it returns a specified value - then it stops.
 """
-f = open('data.b', 'rb')
-chunks = iter(lambda: f.read(20), b'')
+if __name__ == '__main__':
+    f = open('data.b', 'rb')
+    chunks = iter(lambda: f.read(20), b'')
 
-for chk in chunks:
-    print(chk)
+    for chk in chunks:
+        print(chk)
 
 
 # Iterables are nice because they allow you create records using a generator comprehension
@@ -107,14 +109,16 @@ def unpack_records(format, data):
 # You can use namedtuple to unpack records and set attribute names
 Record = namedtuple('Record', ['kind','x','y'])
 
-with open('data.p', 'rb') as f:
-    records = (Record(*r) for r in read_records('<idd', f))
+if __name__ == '__main__':
+    with open('data.b', 'rb') as f:
+        records = [Record(*r) for r in read_records('<idd', f)]
 
-for r in records:
-    print(r.kind, r.x, r.y)
+    for r in records:
+        print(r.kind, r.x, r.y)
 
 # When working with lots of data use numpy
-f = open('data.b', 'rb')
-records = np.fromfile(f, dtype='<i,<d,<d')
-records[0]
-records[1]
+if __name__ == '__main__':
+    f = open('data.b', 'rb')
+    records = np.fromfile(f, dtype='<i,<d,<d')
+    records[0]
+    records[1]
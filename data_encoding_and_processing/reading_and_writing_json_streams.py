@@ -0,0 +1,348 @@
+"""
+This script shows how to read and write a stream of JSON objects - either
+JSON Lines (one object per line) or objects simply concatenated together -
+without ever holding the whole stream in memory.
+
+json.load() in reading_and_writing_json.py reads the whole document before
+decoding it, which is not an option for tens of gigabytes of event logs.
+Instead the data is read a block at a time and JSONDecoder.raw_decode() is
+used to pull complete objects off the front of the buffer.
+"""
+import codecs
+import io
+import json
+from functools import lru_cache
+
+CHUNK_SIZE = 1 << 16
+_NUMBER_CHARS = frozenset('0123456789+-.eE')
+# Length of -Infinity, the longest token that can be cut short
+_LONGEST_TOKEN = 9
+
+
+def _text_chunks(f, chunk_size, encoding):
+    # Binary files (and socket.makefile('rb')) are decoded incrementally so that
+    # a multi-byte character split across two reads is handled correctly
+    # read1() hands back whatever is available rather than blocking on a
+    # socket until chunk_size bytes have arrived
+    read = getattr(f, 'read1', f.read)
+    chunks = iter(lambda: read(chunk_size), f.read(0))
+    first = next(chunks, None)
+    if first is None:
+        return
+    if isinstance(first, str):
+        yield first
+        yield from chunks
+    else:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        yield decoder.decode(first)
+        for chunk in chunks:
+            yield decoder.decode(chunk)
+        yield decoder.decode(b'', final=True)
+
+
+def iter_json_lines(f, object_hook=None, object_pairs_hook=None, encoding='utf-8'):
+    """
+    Generate the objects in a JSON Lines file, one per line.
+    Blank lines are skipped.
+    """
+    decoder = json.JSONDecoder(object_hook=object_hook, object_pairs_hook=object_pairs_hook)
+    decode = decoder.decode
+    for line in f:
+        if isinstance(line, bytes):
+            line = line.decode(encoding)
+        if line.strip():
+            yield decode(line)
+
+
+def _incomplete(err, end):
+    # Whether a decoding error could just be the buffer ending part way
+    # through an object. A literal or escape cut short (-Infinity, \uXXXX)
+    # is reported at its start, a string cut short at its opening quote
+    return err.pos >= end - _LONGEST_TOKEN or err.msg.startswith('Unterminated string')
+
+
+def _stream_error(err, consumed, lines, column):
+    # The same error, with the position counted from the start of the stream
+    # rather than from the start of the buffer
+    pos = consumed + err.pos
+    lineno = lines + err.lineno
+    colno = err.colno + column if err.lineno == 1 else err.colno
+    new = json.JSONDecodeError(err.msg, err.doc, err.pos)
+    new.args = ('{}: line {} column {} (char {})'.format(err.msg, lineno, colno, pos),)
+    new.pos, new.lineno, new.colno = pos, lineno, colno
+    return new
+
+
+def iter_json_objects(f, object_hook=None, object_pairs_hook=None,
+                      chunk_size=CHUNK_SIZE, encoding='utf-8'):
+    """
+    Generate the objects from a stream of concatenated JSON values, which
+    may be separated by any amount of whitespace (JSON Lines included).
+
+    Only the unparsed tail of the stream is buffered, so memory is bounded
+    by about twice the size of the largest single object plus chunk_size.
+    Invalid JSON raises json.JSONDecodeError as soon as it is seen, giving
+    its position in the whole stream.
+    """
+    decoder = json.JSONDecoder(object_hook=object_hook, object_pairs_hook=object_pairs_hook)
+    raw_decode = decoder.raw_decode
+    buf = ''
+    # Size the buffer must reach before decoding is tried again
+    wanted = 0
+    # Characters and newlines trimmed off the front of the buffer so far,
+    # and the column the buffer starts at
+    consumed = lines = column = 0
+    for chunk in _text_chunks(f, chunk_size, encoding):
+        buf += chunk
+        if len(buf) < wanted:
+            continue
+        wanted = 0
+        pos = 0
+        end = len(buf)
+        while True:
+            # Skip the whitespace between objects
+            while pos < end and buf[pos] in ' \t\r\n':
+                pos += 1
+            if pos == end:
+                break
+            try:
+                obj, next_pos = raw_decode(buf, pos)
+            except json.JSONDecodeError as err:
+                if not _incomplete(err, end):
+                    raise _stream_error(err, consumed, lines, column) from None
+                # Most likely an object cut in half - wait for more data. For an
+                # object much larger than a chunk, retrying after every chunk would
+                # make decoding it quadratic, so wait until the buffer has doubled
+                wanted = 2 * (end - pos)
+                break
+            # A number cut short at the end of the buffer still decodes (12 of 123.5),
+            # so wait until something that cannot be part of a number follows it
+            if (next_pos == end or buf[next_pos] in _NUMBER_CHARS) and \
+                    isinstance(obj, (int, float)) and not isinstance(obj, bool):
+                break
+            pos = next_pos
+            yield obj
+        # Trim what has been consumed once per chunk rather than per object
+        if pos:
+            newlines = buf.count('\n', 0, pos)
+            if newlines:
+                lines += newlines
+                column = pos - buf.rfind('\n', 0, pos) - 1
+            else:
+                column += pos
+            consumed += pos
+            buf = buf[pos:]
+
+    # Whatever is left must be complete now, or else it is an error
+    pos = 0
+    end = len(buf)
+    while True:
+        while pos < end and buf[pos] in ' \t\r\n':
+            pos += 1
+        if pos == end:
+            break
+        try:
+            obj, pos = raw_decode(buf, pos)
+        except json.JSONDecodeError as err:
+            raise _stream_error(err, consumed, lines, column) from None
+        yield obj
+
+
+class JSONLinesWriter:
+    """
+    Writes objects as JSON Lines, collecting the encoded output and writing
+    it to the underlying file in large blocks.
+    """
+
+    def __init__(self, f, buffer_size=1 << 20, **kwargs):
+        self._file = f
+        self._buffer_size = buffer_size
+        self._encode = json.JSONEncoder(**kwargs).encode
+        self._pending = []
+        self._pending_size = 0
+        self._binary = not isinstance(f, io.TextIOBase)
+
+    def write(self, obj):
+        line = self._encode(obj)
+        self._pending.append(line)
+        self._pending_size += len(line) + 1
+        if self._pending_size >= self._buffer_size:
+            self.flush()
+
+    def write_many(self, objs):
+        encode = self._encode
+        pending = self._pending
+        for obj in objs:
+            line = encode(obj)
+            pending.append(line)
+            self._pending_size += len(line) + 1
+            if self._pending_size >= self._buffer_size:
+                self.flush()
+
+    def flush(self):
+        if self._pending:
+            # Trailing '' gives the final newline
+            self._pending.append('')
+            data = '\n'.join(self._pending)
+            self._file.write(data.encode('utf-8') if self._binary else data)
+            del self._pending[:]
+            self._pending_size = 0
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_ty, exc_val, tb):
+        self.close()
+
+
+"""
+The JSONObject class in reading_and_writing_json.py runs a Python __init__
+for every object decoded. The hook below instead creates the instance with
+__new__ and sets its attributes directly - the same trick
+unserialize_object() uses to avoid calling __init__. One hook is made per
+class and cached.
+
+For a class with __slots__ the hook is compiled to assign each slot from
+the dict in turn, with no instance dict at all. Objects without all of the
+slot keys (such as nested objects of another shape) are left as dicts, and
+any keys that are not slots are dropped. Other classes get the decoded dict
+as their __dict__, which is no faster than JSONObject but works with any
+class, whatever its __init__ takes.
+
+Calling either hook costs about the same as calling JSONObject - the win of
+the __slots__ hook comes after. The decoded dict is thrown away at once, so
+each object is one small instance instead of an instance plus a dict. That
+halves the memory held and leaves the garbage collector, which runs again and
+again while millions of objects are being created, with half as much to scan.
+compare_object_hooks() below measures both - on 200,000 objects:
+
+    JSONObject                     0.396s   70.6MB
+    make_object_hook(JSONObject)   0.372s   70.6MB
+    make_object_hook(Event)        0.274s   33.8MB
+"""
+
+
+def _slots(cls):
+    names = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get('__slots__', ())
+        names.extend([slots] if isinstance(slots, str) else slots)
+    return [name for name in names if name not in ('__dict__', '__weakref__')]
+
+
+@lru_cache(maxsize=None)
+def make_object_hook(cls):
+    new = cls.__new__
+    fields = _slots(cls) if '__slots__' in cls.__dict__ else None
+    if fields:
+        # Straight line code - one store per slot and no loop
+        assignments = ''.join('        obj.{0} = d[{0!r}]\n'.format(name) for name in fields)
+        code = ('def object_hook(d):\n'
+                '    obj = new(cls)\n'
+                '    try:\n'
+                '{}'
+                '    except KeyError:\n'
+                '        return d\n'
+                '    return obj\n').format(assignments)
+        namespace = {'new': new, 'cls': cls}
+        exec(code, namespace)
+        return namespace['object_hook']
+
+    def object_hook(d):
+        obj = new(cls)
+        obj.__dict__ = d
+        return obj
+    return object_hook
+
+
+class JSONObject:
+    pass
+
+
+class Event:
+    __slots__ = ('name', 'shares', 'price')
+
+
+def compare_object_hooks(n=200000, repeat=5):
+    """
+    Decode n objects with the JSONObject recipe and with make_object_hook(),
+    returning {name: (best time in seconds, MB held by the result)}
+    """
+    import gc
+    import time
+    import tracemalloc
+
+    class RecipeJSONObject:
+        # As in reading_and_writing_json.py
+        def __init__(self, d):
+            self.__dict__ = d
+
+    s = json.dumps([{'name': 'ACME', 'shares': i, 'price': i * 0.5} for i in range(n)])
+    hooks = [('JSONObject', RecipeJSONObject),
+             ('make_object_hook(JSONObject)', make_object_hook(JSONObject)),
+             ('make_object_hook(Event)', make_object_hook(Event))]
+    times = {name: [] for name, _ in hooks}
+    # Taking turns, so that each is affected by the machine the same way
+    for _ in range(repeat):
+        for name, hook in hooks:
+            gc.collect()
+            start = time.perf_counter()
+            json.loads(s, object_hook=hook)
+            times[name].append(time.perf_counter() - start)
+    results = {}
+    for name, hook in hooks:
+        gc.collect()
+        tracemalloc.start()
+        objs = json.loads(s, object_hook=hook)
+        held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del objs
+        results[name] = (min(times[name]), held / 1e6)
+    return results
+
+
+# Usage
+if __name__ == '__main__':
+    events = [{'name': 'ACME', 'shares': 100, 'price': 542.23},
+              {'name': 'IBM', 'shares': 50, 'price': 91.1}]
+
+    with open('events.jsonl', 'w') as f:
+        with JSONLinesWriter(f) as writer:
+            writer.write_many(events)
+
+    with open('events.jsonl') as f:
+        for event in iter_json_lines(f, object_hook=make_object_hook(JSONObject)):
+            print(event.name, event.shares, event.price)
+
+    # Smallest and quickest to decode, when every object has the same fields
+    with open('events.jsonl') as f:
+        for event in iter_json_lines(f, object_hook=make_object_hook(Event)):
+            print(event.name, event.shares, event.price)
+
+    # Concatenated JSON, such as read from a socket with sock.makefile('rb')
+    stream = io.BytesIO(b'{"a": 1}{"b": [1, 2]} 3 "four"\n[5]')
+    for obj in iter_json_objects(stream, chunk_size=4):
+        print(obj)
+
+    for name, (seconds, mb) in compare_object_hooks().items():
+        print('{:30} {:.3f}s {:6.1f}MB'.format(name, seconds, mb))
+
+"""
+If the stream is known to be JSON Lines, iter_json_lines() is the faster of
+the two as the file object already does the splitting. iter_json_objects()
+works for both, and for values spread over several lines.
+
+A bare number at the end of a chunk is ambiguous (12 may turn out to be 123.5),
+so it is only handed back once the next chunk or the end of the stream has been seen.
+A decoding error close to the end of the buffer is taken to be an object cut
+in half. Anywhere else it can only be bad JSON, so it is raised there and then
+rather than after buffering the rest of the stream.
+
+On the writing side each encoded object is collected in a list, then joined
+and written in one call once about buffer_size characters are waiting,
+which keeps the number of write calls small.
+"""
@@ -0,0 +1,186 @@
+"""
+This script shows how to parse a large csv file using several processes,
+while handing back exactly the same rows as csv.reader, csv.DictReader or
+the namedtuple recipe in reading_and_writing_csv.py.
+
+The file is cut into byte ranges, each range is parsed in a worker and
+the results are returned in file order. The tricky part is choosing where
+to cut. A newline only ends a record if it is not inside a quoted field,
+so the split points have to take the quotes seen so far into account.
+"""
+import csv
+import io
+import multiprocessing
+import os
+import re
+from collections import deque, namedtuple
+from itertools import islice
+
+CHUNK_SIZE = 1 << 20
+
+
+def _record_end(chunk, start, quotes, quotechar):
+    """
+    Return the index just past the first newline at or after start that is
+    outside of quotes (or None), along with the updated quote count.
+    quotes is the number of quote characters seen before start.
+    """
+    while True:
+        nl = chunk.find(b'\n', start)
+        if nl < 0:
+            return None, quotes + chunk.count(quotechar, start)
+        quotes += chunk.count(quotechar, start, nl)
+        start = nl + 1
+        # An even number of quotes means we are outside of any quoted field.
+        # Escaped quotes ("") come in pairs so do not upset the count.
+        if quotes % 2 == 0:
+            return start, quotes
+
+
+def find_split_points(f, chunk_size, quotechar='"'):
+    """
+    Scan a binary file once and return a list of byte offsets at which
+    records start - the first is the end of the header row, and the rest
+    are roughly chunk_size apart. The last entry is the size of the file.
+    """
+    quotechar = quotechar.encode('ascii')
+    f.seek(0)
+    points = []
+    # Quote characters seen before the current position
+    quotes = 0
+    pos = 0
+    # The first split point wanted is the end of the header
+    target = 0
+    for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+        i = 0
+        while i < len(block):
+            if pos + i < target:
+                # Skip ahead to the target, counting the quotes on the way
+                j = min(target - pos, len(block))
+                quotes += block.count(quotechar, i, j)
+                i = j
+                continue
+            end, quotes = _record_end(block, i, quotes, quotechar)
+            if end is None:
+                # Carry on looking in the next block
+                break
+            points.append(pos + end)
+            i = end
+            target = pos + end + chunk_size
+        pos += len(block)
+    if not points or points[-1] != pos:
+        points.append(pos)
+    return points
+
+
+def sanitize_headers(headers):
+    # Same as reading_and_writing_csv.py - make headers valid identifiers
+    return [re.sub('[^a-zA-Z_]', '_', h) for h in headers]
+
+
+def _dict_row(headers, row, restkey, restval):
+    # The same as csv.DictReader makes of a row of the wrong length
+    d = dict(zip(headers, row))
+    if len(row) > len(headers):
+        d[restkey] = list(row[len(headers):])
+    else:
+        for key in headers[len(row):]:
+            d[key] = restval
+    return d
+
+
+def _parse_range(args):
+    filename, start, end, encoding, headers, style, col_types, restkey, restval = args
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode(encoding)
+    f_csv = csv.reader(io.StringIO(text, newline=''))
+    if style != 'list':
+        # csv.DictReader skips blank lines, which come back as empty rows
+        f_csv = (row for row in f_csv if row)
+    if col_types:
+        # Any values beyond the types given are left as they are
+        ntypes = len(col_types)
+        f_csv = (tuple(convert(value) for convert, value in zip(col_types, row)) + tuple(row[ntypes:])
+                 for row in f_csv)
+    if style == 'dict':
+        nheaders = len(headers)
+        return [dict(zip(headers, row)) if len(row) == nheaders else _dict_row(headers, row, restkey, restval)
+                for row in f_csv]
+    if style == 'namedtuple':
+        # namedtuple classes made on the fly cannot be pickled, so
+        # plain tuples are sent back and wrapped by the parent
+        return [tuple(row) for row in f_csv]
+    return list(f_csv)
+
+
+def read_csv_parallel(filename, style='list', col_types=None, processes=None,
+                      chunk_size=16 * CHUNK_SIZE, encoding='utf-8',
+                      restkey=None, restval=None, max_pending=None):
+    """
+    Generate the rows of a csv file, parsed in a pool of processes.
+
+    style is one of 'list' (like csv.reader), 'dict' (like csv.DictReader,
+    including restkey and restval) or 'namedtuple'. col_types is an optional
+    list of conversion functions applied to each row in the workers.
+
+    At most max_pending chunks (by default two per process) are parsed ahead
+    of the rows being consumed, so a slow consumer does not end up with the
+    whole file in memory.
+    """
+    if style not in ('list', 'dict', 'namedtuple'):
+        raise ValueError('Unknown row style {!r}'.format(style))
+
+    with open(filename, 'rb') as f:
+        points = find_split_points(f, chunk_size)
+        f.seek(0)
+        header_text = f.read(points[0]).decode(encoding)
+    headers = next(csv.reader(io.StringIO(header_text, newline='')))
+    # Done once here rather than in every worker
+    if style == 'namedtuple':
+        headers = sanitize_headers(headers)
+        Row = namedtuple('Row', headers)
+
+    tasks = ((filename, start, end, encoding, headers, style, col_types, restkey, restval)
+             for start, end in zip(points, points[1:]))
+    if max_pending is None:
+        max_pending = 2 * (processes or os.cpu_count() or 1)
+    with multiprocessing.Pool(processes) as pool:
+        # Results are collected in the same order as the tasks, and a new
+        # task is only handed out as each result is taken
+        pending = deque(pool.apply_async(_parse_range, (task,)) for task in islice(tasks, max_pending))
+        while pending:
+            rows = pending.popleft().get()
+            for task in islice(tasks, 1):
+                pending.append(pool.apply_async(_parse_range, (task,)))
+            if style == 'namedtuple':
+                yield from map(Row._make, rows)
+            else:
+                yield from rows
+
+
+# Usage
+if __name__ == '__main__':
+    for row in read_csv_parallel('stocks.csv'):
+        print(row)
+
+    for row in read_csv_parallel('stocks.csv', style='namedtuple'):
+        print(row.Symbol, row.Price)
+
+    col_types = [str, float, str, str, float, int]
+    for row in read_csv_parallel('stocks.csv', style='dict', col_types=col_types):
+        print(row)
+
+"""
+Finding the split points needs one sequential read of the file, but it only
+uses bytes.find() and bytes.count() which run at close to memory speed,
+so it is cheap compared to parsing.
+
+The quote counting assumes the default excel dialect - fields quoted with ",
+quotes escaped by doubling them and records ending with a newline. Blank
+lines are skipped for 'dict' and 'namedtuple' rows, as csv.DictReader does,
+and short or long rows get its restval and restkey handling.
+
+The parent only has to unpickle the rows and yield them, so keep the work
+that can be done in the workers (such as col_types conversion) there.
+"""
@@ -28,15 +28,16 @@ def write_polys(filename, polys):
     with open(filename, "wb") as f:
         f.write(struct.pack("<iddddi", 0x1234, min_x, min_y, max_x, max_y, len(polys)))
 
-    for poly in polys:
-        size = len(poly) * struct.calcsize("<dd")
-        f.write(struct.pack("<i", size + 4))
-        for pt in poly:
-            f.write(struct.pack("<dd", *pt))
+        for poly in polys:
+            size = len(poly) * struct.calcsize("<dd")
+            f.write(struct.pack("<i", size + 4))
+            for pt in poly:
+                f.write(struct.pack("<dd", *pt))
 
 
 # Call it with polygon data
-write_polys("polys.bin", polys)
+if __name__ == "__main__":
+    write_polys("polys.bin", polys)
 
 # To read the result - use struct.unpack() reversing the opeartion above
 def read_polys(filename):
@@ -113,14 +114,15 @@ class PolyHeader(Structure):
 
 
 # Here is an example of how to use this to read the header from the polygon data
-f = open("polys.bin", "rb")
-phead = PolyHeader(f.read(40))
-phead.file_code == 0x1234
-phead.min_x
-phead.max_x
-phead.min_y
-phead.max_y
-phnead.num_polys
+if __name__ == "__main__":
+    f = open("polys.bin", "rb")
+    phead = PolyHeader(f.read(40))
+    phead.file_code == 0x1234
+    phead.min_x
+    phead.max_x
+    phead.min_y
+    phead.max_y
+    phead.num_polys
 
 """
 This approach has some annoyances - the code is verbose and requires the user to specify a lot of low level details.
@@ -154,9 +156,9 @@ class StructureMeta(type):
 
 class Structure(metaclass=StructureMeta):
     def __init__(self, bytedata):
-        self.buffer = bytedata
+        self._buffer = memoryview(bytedata)
 
-    # classmethod
+    @classmethod
     def from_file(cls, f):
         return cls(f.read(cls.struct_size))
 
@@ -174,14 +176,15 @@ class PolyHeader(Structure):
 
 
 # From file makes it easier to read the data from a file without knowing details about the size or structure of the data
-f = open("polys.bin", "rb")
-phead = PolyHeader.from_file(f)
-phead.file_code = 0x1234
-phead.mix_x
-phead.min_y
-phead.max_x
-phead.max_y
-phead.num_polys
+if __name__ == "__main__":
+    f = open("polys.bin", "rb")
+    phead = PolyHeader.from_file(f)
+    phead.file_code == 0x1234
+    phead.min_x
+    phead.min_y
+    phead.max_x
+    phead.max_y
+    phead.num_polys
 
 
 """
@@ -249,6 +252,16 @@ class StructureMeta(type):
         setattr(self, "struct_size", offset)
 
 
+# Structure has to be defined again so that it picks up the new metaclass
+class Structure(metaclass=StructureMeta):
+    def __init__(self, bytedata):
+        self._buffer = memoryview(bytedata)
+
+    @classmethod
+    def from_file(cls, f):
+        return cls(f.read(cls.struct_size))
+
+
 """
 Using this we can write code as follows...
 """
@@ -263,9 +276,10 @@ class PolyHeader(Structure):
 
 
 # This works as you expect
-f = open("polys.bin", "rb")
-phead = PolyHeader.from_file(f)
-phead.file_code = 0x1234
+if __name__ == "__main__":
+    f = open("polys.bin", "rb")
+    phead = PolyHeader.from_file(f)
+    phead.file_code == 0x1234
 
 # So far we have dealt with fixed size sections - to deal with variable size sections we can write
 # a new class that represents a chunk of binary data along with a utility function for interpreting the
@@ -308,22 +322,23 @@ class SizedRecord:
 
 
 # Usage shown below
-f = open("polys.bin", "rb")
-phead = PolyHeader.from_file(f)
-phead.num_polys
-polydata = [SizedRecord.from_file(f, "<i") for n in range(phead.num_polys)]
-polydata
-
-# To interpret the contents of theSizedRecord instances use iter_as() method
-for n, poly in enumerate(polydata):
-    print("Polygon", n)
-    for p in poly.iter_as("<dd"):
-        print(p)
-
-for n, poly in enumerate(polydata):
-    print("Polygon", n)
-    for p in poly.iter_as(Point):
-        print(p.x, p.y)
+if __name__ == "__main__":
+    f = open("polys.bin", "rb")
+    phead = PolyHeader.from_file(f)
+    phead.num_polys
+    polydata = [SizedRecord.from_file(f, "<i") for n in range(phead.num_polys)]
+    polydata
+
+    # To interpret the contents of theSizedRecord instances use iter_as() method
+    for n, poly in enumerate(polydata):
+        print("Polygon", n)
+        for p in poly.iter_as("<dd"):
+            print(p)
+
+    for n, poly in enumerate(polydata):
+        print("Polygon", n)
+        for p in poly.iter_as(Point):
+            print(p.x, p.y)
 
 # putting the above together - here is a read_polys() function
 
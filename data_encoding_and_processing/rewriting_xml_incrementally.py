@@ -0,0 +1,180 @@
+"""
+This script shows how to modify an XML document as it is being read,
+writing the result out as it goes, so that documents of any size can be
+rewritten in a small, fixed amount of memory.
+
+parsing_modifying_rewriting_xml.py parses the whole of pred.xml into a tree,
+removes <sri> and <cr>, inserts a <spam> element and writes the tree back out.
+The same changes can be described up front as a set of rules - remove this,
+insert that, rename the other - and applied to the stream of parser events,
+copying everything else straight through to the output.
+
+The low level expat parser is used for this, rather than iterparse(), because
+it reports text, comments and namespace prefixes exactly as they appear in the
+input - iterparse() expands prefixes into {uri} names which would then have to
+be turned back into prefixes on the way out.
+"""
+from xml.parsers import expat
+from xml.sax.saxutils import escape, quoteattr
+
+CHUNK_SIZE = 1 << 16
+
+
+def _start_tag(tag, attrs):
+    return '<{}{}>'.format(tag, ''.join(' {}={}'.format(name, quoteattr(value))
+                                        for name, value in attrs.items()))
+
+
+def _element(tag, text=None, attrs=None):
+    return '{}{}</{}>'.format(_start_tag(tag, attrs or {}), escape(text or ''), tag)
+
+
+class XMLRewriter:
+    """
+    A set of rules applied while copying an XML document.
+
+    Paths are relative to the root element, as used with root.find()
+    in parsing_modifying_rewriting_xml.py.
+    """
+
+    def __init__(self):
+        self._removes = set()
+        self._renames = {}
+        self._before = {}
+        self._after = {}
+
+    def remove(self, path):
+        """
+        Drop every element matching path, along with its contents
+        """
+        self._removes.add(path)
+        return self
+
+    def rename(self, path, tag):
+        self._renames[path] = tag
+        return self
+
+    def insert(self, path, tag, text=None, attrs=None, before=False):
+        """
+        Insert a new element after (or before) every element matching path
+        """
+        inserts = self._before if before else self._after
+        inserts.setdefault(path, []).append(_element(tag, text, attrs))
+        return self
+
+    def rewrite(self, source, dest, encoding='utf-8'):
+        """
+        Apply the rules to the document in the binary file source, writing the
+        result to dest (a filename or a text file)
+        """
+        if isinstance(dest, str):
+            with open(dest, 'w', encoding=encoding, errors='xmlcharrefreplace') as f:
+                return self.rewrite(source, f, encoding)
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                return self.rewrite(f, dest, encoding)
+
+        write = dest.write
+        write("<?xml version='1.0' encoding='{}'?>\n".format(encoding))
+        removes = self._removes
+        renames = self._renames
+        before = self._before
+        after = self._after
+
+        # The path of each open element, relative to the root
+        path_stack = []
+        # The (possibly renamed) tag to close each open element with
+        tag_stack = []
+        # Depth of the element being removed, while inside it, and whether the
+        # text up to the next event is the tail of a removed element
+        state = {'skip_depth': None, 'skip_tail': False}
+
+        def start(tag, attrs):
+            state['skip_tail'] = False
+            if not path_stack:
+                path = ''
+            elif len(path_stack) == 1:
+                path = tag
+            else:
+                path = path_stack[-1] + '/' + tag
+            path_stack.append(path)
+            if state['skip_depth'] is not None:
+                return
+            if path in removes:
+                state['skip_depth'] = len(path_stack)
+                return
+            if path in before:
+                write(''.join(before[path]))
+            tag = renames.get(path, tag)
+            tag_stack.append(tag)
+            write(_start_tag(tag, attrs))
+
+        def end(tag):
+            state['skip_tail'] = False
+            path = path_stack.pop()
+            skip_depth = state['skip_depth']
+            if skip_depth is not None:
+                if skip_depth == len(path_stack) + 1:
+                    state['skip_depth'] = None
+                    # Like Element.remove(), the text after the element goes too
+                    state['skip_tail'] = True
+                return
+            write('</{}>'.format(tag_stack.pop()))
+            if path in after:
+                write(''.join(after[path]))
+
+        def chardata(data):
+            if state['skip_depth'] is None and not state['skip_tail']:
+                write(escape(data))
+
+        def comment(data):
+            state['skip_tail'] = False
+            if state['skip_depth'] is None:
+                write('<!--{}-->'.format(data))
+
+        def pi(target, data):
+            state['skip_tail'] = False
+            if state['skip_depth'] is None:
+                write('<?{} {}?>'.format(target, data))
+
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = chardata
+        parser.CommentHandler = comment
+        parser.ProcessingInstructionHandler = pi
+
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            parser.Parse(chunk, False)
+        parser.Parse(b'', True)
+        write('\n')
+
+
+# Usage
+if __name__ == '__main__':
+    # The same changes as parsing_modifying_rewriting_xml.py
+    rewriter = XMLRewriter()
+    rewriter.remove('sri')
+    rewriter.remove('cr')
+    rewriter.insert('nm', 'spam', 'This is a test')
+
+    rewriter.rewrite('pred.xml', 'newpred.xml')
+    print(open('newpred.xml').read())
+
+    # Rules can be chained
+    XMLRewriter().rename('pre/pt', 'time').remove('pre/fd').rewrite('pred.xml', 'newpred.xml')
+
+"""
+Only the paths of the currently open elements are kept, so memory use depends
+on how deeply the document is nested, not on its size. Each path is built by
+appending the tag to its parent's path, so checking an element against all of
+the rules is a few dictionary and set lookups.
+
+Removing an element skips everything until its end tag, and then - matching
+what Element.remove() does - also drops the text that follows it, which is
+usually just the indentation before the next element.
+
+Rules match on the tag names as written in the document, including any
+namespace prefix, such as 'atom:entry'.
+"""
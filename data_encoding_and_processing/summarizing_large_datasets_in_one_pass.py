@@ -0,0 +1,175 @@
+"""
+This script shows how to compute the summaries from
+summarizing_data_and_performing_statistics.py over a csv file that is too large
+to load into a pandas DataFrame.
+
+Every one of those summaries - the unique values of a field, how many rows pass
+a filter, value counts and group sizes - can be built up a row at a time from a
+set or a Counter, in a single pass over the file. Better still, two partial
+summaries are combined just by merging their sets and adding their Counters,
+so different parts of the file can be summarised in different processes.
+
+This example uses the rat and rodent database of chicago see:
+https://data.cityofchicago.org/Service-Requests/311-Service-Requests-Rodent-Baiting-Historical/97t6-zrhs
+"""
+import csv
+import io
+import multiprocessing
+from collections import Counter
+from itertools import islice
+
+from reading_csv_files_in_parallel import find_split_points
+
+
+class Summary:
+    """
+    A mergeable one pass summary of csv rows.
+
+    unique - fields to collect the distinct values of (over all rows)
+    where - optional (field, value) pair, rows must match it to be counted below
+    value_counts - fields to count the values of
+    group_by - field to count the size of each group of
+
+    Blank lines are ignored. Other rows with the wrong number of fields
+    (such as a footer) are not summarised but counted in skipped.
+    """
+
+    def __init__(self, unique=(), where=None, value_counts=(), group_by=None):
+        self.spec = (tuple(unique), where, tuple(value_counts), group_by)
+        self.rows = 0
+        self.matched = 0
+        self.skipped = 0
+        self.unique = {field: set() for field in unique}
+        self.value_counts = {field: Counter() for field in value_counts}
+        self.group_sizes = Counter()
+
+    def empty(self):
+        # A new summary of the same things
+        return Summary(*self.spec)
+
+    def update(self, rows, headers):
+        unique, where, value_counts, group_by = self.spec
+        index = {name: n for n, name in enumerate(headers)}
+        ncols = len(headers)
+        unique = [(index[field], self.unique[field]) for field in unique]
+        counts = [(index[field], self.value_counts[field]) for field in value_counts]
+        where_col, where_value = (index[where[0]], where[1]) if where else (None, None)
+        group_col = index[group_by] if group_by else None
+        group_sizes = self.group_sizes
+
+        for row in rows:
+            if len(row) != ncols:
+                # Blank lines come back as [] - anything else is a bad row
+                if row:
+                    self.skipped += 1
+                continue
+            self.rows += 1
+            for col, values in unique:
+                values.add(row[col])
+            if where_col is not None and row[where_col] != where_value:
+                continue
+            self.matched += 1
+            for col, counter in counts:
+                counter[row[col]] += 1
+            if group_col is not None:
+                group_sizes[row[group_col]] += 1
+        return self
+
+    def merge(self, other):
+        if other.spec != self.spec:
+            raise ValueError('Can only merge summaries of the same things')
+        self.rows += other.rows
+        self.matched += other.matched
+        self.skipped += other.skipped
+        for field, values in other.unique.items():
+            self.unique[field] |= values
+        for field, counter in other.value_counts.items():
+            self.value_counts[field].update(counter)
+        self.group_sizes.update(other.group_sizes)
+        return self
+
+    def top(self, field, n=10):
+        return self.value_counts[field].most_common(n)
+
+
+def _summarize_range(args):
+    filename, start, end, headers, summary, encoding = args
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode(encoding)
+    return summary.update(csv.reader(io.StringIO(text, newline='')), headers)
+
+
+def summarize_csv(filename, summary, processes=1, chunk_size=1 << 24, encoding='utf-8'):
+    """
+    Fill in summary from the rows of a csv file. With processes > 1 the file is
+    split into chunks of about chunk_size bytes which are summarised in a pool
+    of processes and then merged.
+    """
+    if processes == 1:
+        with open(filename, newline='', encoding=encoding) as f:
+            f_csv = csv.reader(f)
+            headers = next(f_csv)
+            # Summarise in blocks of rows so that only one block is in memory at a time
+            while True:
+                rows = list(islice(f_csv, 65536))
+                if not rows:
+                    break
+                summary.update(rows, headers)
+        return summary
+
+    with open(filename, 'rb') as f:
+        points = find_split_points(f, chunk_size)
+        f.seek(0)
+        headers = next(csv.reader(io.StringIO(f.read(points[0]).decode(encoding), newline='')))
+    tasks = [(filename, start, end, headers, summary.empty(), encoding)
+             for start, end in zip(points, points[1:])]
+    with multiprocessing.Pool(processes) as pool:
+        for partial in pool.imap_unordered(_summarize_range, tasks):
+            summary.merge(partial)
+    return summary
+
+
+# Usage
+if __name__ == '__main__':
+    summary = Summary(unique=['Current Activity'],
+                      where=('Current Activity', 'Dispatch Crew'),
+                      value_counts=['ZIP Code'],
+                      group_by='Completion Date')
+    summarize_csv('rats.csv', summary, processes=4)
+
+    # Range of values for a certain field
+    summary.unique['Current Activity']
+
+    # Number of rows where a crew was dispatched
+    summary.matched
+
+    # Rows left out for having the wrong number of fields (the footer)
+    summary.skipped
+
+    # Find 10 most rat infested ZIP codes in Chicago
+    summary.top('ZIP Code', 10)
+
+    # Number of completion dates, and counts on each day
+    len(summary.group_sizes)
+    date_counts = summary.group_sizes
+
+    # The 10 busiest days
+    date_counts.most_common(10)
+
+"""
+Memory use depends only on the number of distinct values being tracked -
+the ZIP codes and dates here - never on the number of rows, and the file itself
+is read one block of rows at a time.
+
+The parallel version splits the file with find_split_points() from
+reading_csv_files_in_parallel.py, so quoted fields containing newlines are
+never cut in half. Each worker starts from an empty copy of the summary and
+sends back its partial result, which the parent merges as they arrive - the
+order does not matter since sets and Counters merge the same either way.
+
+Rows with the wrong number of fields are left out and counted in skipped,
+so the loss is visible. This covers the footer line that the pandas version
+drops with skip_footer=1. Blank lines are not counted.
+Both versions decode the file with the same encoding, UTF-8 by default.
+"""
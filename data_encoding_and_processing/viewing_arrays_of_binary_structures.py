@@ -0,0 +1,264 @@
+"""
+This script shows how to treat a memory mapped file (or any buffer) holding
+many fixed size structures back to back as an array of Structure objects.
+
+Structure instances in reading_nested_variable_sized_binary_structures.py are
+created one at a time with from_file(), and every attribute access goes
+through StructField.__get__(), which calls struct.unpack_from() again each
+time. That is fine for a field read once, but a header consulted over and over
+in a loop pays for the unpacking on every access.
+
+StructureArray overlays the Structure definition on the buffer with memoryview
+slices, so nothing is copied. When an element is first accessed, all of its
+fields are unpacked in one go and stored on the instance, and the most recently
+used elements are kept in a cache of bounded size.
+"""
+import mmap
+import struct
+from functools import lru_cache
+
+from reading_nested_variable_sized_binary_structures import NestedStruct, Point, PolyHeader, write_polys
+
+_BYTE_ORDERS = ("<", ">", "!", "=", "@")
+
+
+def _flatten(struct_type, base=0):
+    """
+    Generate (offset, format, name) for every simple field of a structure,
+    where name is a tuple giving the path to nested fields
+    """
+    for _, fieldname in struct_type._fields_:
+        desc = getattr(struct_type, fieldname)
+        if isinstance(desc, NestedStruct):
+            for offset, format, name in _flatten(desc.struct_type, base + desc.offset):
+                yield offset, format, (fieldname,) + name
+        else:
+            yield base + desc.offset, desc.format, (fieldname,)
+
+
+@lru_cache(maxsize=None)
+def _layout(struct_type):
+    """
+    Work out how to unpack a whole structure with a single Struct, if possible.
+
+    Returns (record_struct, fields) where fields is a list of
+    (offset, format, name, number of values). record_struct is None if the
+    fields mix byte orders or use native alignment, in which case each field
+    has to be unpacked separately.
+    """
+    fields = []
+    byte_orders = set()
+    codes = []
+    for offset, format, name in _flatten(struct_type):
+        byte_order = format[0] if format.startswith(_BYTE_ORDERS) else "@"
+        byte_orders.add(byte_order)
+        codes.append(format.lstrip("".join(_BYTE_ORDERS)))
+        nvalues = len(struct.unpack(format, bytes(struct.calcsize(format))))
+        fields.append((offset, format, name, nvalues))
+
+    record_struct = None
+    if len(byte_orders) == 1 and "@" not in byte_orders:
+        record_struct = struct.Struct(byte_orders.pop() + "".join(codes))
+        if record_struct.size != struct_type.struct_size:
+            record_struct = None
+    return record_struct, fields
+
+
+def load(struct_type, buffer, offset=0):
+    """
+    Create a struct_type instance over buffer[offset:] with every field
+    already unpacked, so that reading its attributes never calls struct again
+    """
+    record_struct, fields = _layout(struct_type)
+    buffer = memoryview(buffer)
+    if record_struct is not None:
+        values = record_struct.unpack_from(buffer, offset)
+    else:
+        values = []
+        for field_offset, format, _, _ in fields:
+            values.extend(struct.unpack_from(format, buffer, offset + field_offset))
+
+    obj = struct_type(buffer[offset : offset + struct_type.struct_size])
+    pos = 0
+    for _, _, name, nvalues in fields:
+        value = values[pos] if nvalues == 1 else tuple(values[pos : pos + nvalues])
+        pos += nvalues
+        target = obj
+        for part in name[:-1]:
+            # Creates and stores the nested structure the first time through
+            target = getattr(target, part)
+        # StructField has no __set__, so the instance value hides the descriptor
+        target.__dict__[name[-1]] = value
+    return obj
+
+
+class StructureArray:
+    """
+    A sequence of struct_type structures stored one after another in buffer,
+    starting at offset.
+
+    Up to cache_size decoded elements are kept, least recently used first out.
+    Slices share the buffer and the cache with the array they came from.
+    """
+
+    def __init__(self, struct_type, buffer, offset=0, count=None, cache_size=1024):
+        self.struct_type = struct_type
+        self._buffer = memoryview(buffer)
+        self._offset = offset
+        self._stride = struct_type.struct_size
+        if count is None:
+            count = (len(self._buffer) - offset) // self._stride
+        elif offset + count * self._stride > len(self._buffer):
+            raise ValueError("buffer is too small for {} structures".format(count))
+        self._count = count
+        self._load = lru_cache(maxsize=cache_size)(self._load_at)
+
+    @classmethod
+    def from_file(cls, struct_type, filename, offset=0, count=None, cache_size=1024):
+        """
+        Memory map a file read-only and view it as an array of struct_type
+        """
+        with open(filename, "rb") as f:
+            # The map stays valid after the file itself is closed
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = cls(struct_type, m, offset, count, cache_size)
+        view._mmap = m
+        return view
+
+    def _load_at(self, offset):
+        return load(self.struct_type, self._buffer, offset)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            view = object.__new__(StructureArray)
+            view.struct_type = self.struct_type
+            view._buffer = self._buffer
+            view._offset = self._offset + start * self._stride
+            view._stride = self._stride * step
+            view._count = len(range(start, stop, step))
+            view._load = self._load
+            return view
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("structure index out of range")
+        return self._load(self._offset + index * self._stride)
+
+    def __iter__(self):
+        load = self._load
+        for offset in range(self._offset, self._offset + self._count * self._stride, self._stride):
+            yield load(offset)
+
+    def column(self, name):
+        """
+        Return a list of the values of one field, such as 'num_polys' or
+        'min.x', for every element. Only that field is unpacked, and the
+        cache is bypassed.
+        """
+        path = tuple(name.split("."))
+        _, fields = _layout(self.struct_type)
+        for field_offset, format, field_name, nvalues in fields:
+            if field_name == path:
+                break
+        else:
+            raise KeyError(name)
+
+        if format.startswith(_BYTE_ORDERS) and format[0] != "@":
+            # Skip over the rest of each structure with pad bytes, so that
+            # iter_unpack() does all the work in a single call
+            size = struct.calcsize(format)
+            padded = struct.Struct("{}{}x{}{}x".format(format[0], field_offset, format[1:],
+                                                       self.struct_type.struct_size - field_offset - size))
+            if self._stride == padded.size:
+                end = self._offset + self._count * self._stride
+                values = padded.iter_unpack(self._buffer[self._offset : end])
+                if nvalues == 1:
+                    return [value for (value,) in values]
+                return list(values)
+
+        unpack_from = struct.Struct(format).unpack_from
+        values = [unpack_from(self._buffer, offset + field_offset)
+                  for offset in range(self._offset, self._offset + self._count * self._stride, self._stride)]
+        if nvalues == 1:
+            return [value for (value,) in values]
+        return values
+
+    def cache_info(self):
+        return self._load.cache_info()
+
+    def close(self):
+        """
+        Release the buffer, and the memory map if from_file() created one.
+        Elements handed out still refer to the buffer, so release them first.
+        """
+        self._load.cache_clear()
+        self._buffer.release()
+        m = getattr(self, "_mmap", None)
+        if m is not None:
+            m.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_ty, exc_val, tb):
+        self.close()
+
+
+# Usage
+if __name__ == "__main__":
+    import random
+
+    # A file of nothing but headers, one after another
+    with open("headers.bin", "wb") as f:
+        for n in range(100000):
+            f.write(struct.pack("<iddddi", 0x1234, random.random(), random.random(),
+                                random.random(), random.random(), n))
+
+    with StructureArray.from_file(PolyHeader, "headers.bin") as headers:
+        print(len(headers))
+        h = headers[5]
+        print(h.file_code == 0x1234, h.min.x, h.max.y, h.num_polys)
+        # The same decoded object comes back from the cache
+        assert headers[5] is h
+
+        # Slicing makes no copies
+        evens = headers[::2]
+        print(evens[3].num_polys)
+
+        # A whole column at a time
+        min_x = headers.column("min.x")
+        print(max(min_x), sum(headers[:10].column("num_polys")))
+        print(headers.cache_info())
+        del h
+
+    # The points of a polygon are an array of Point structures too
+    write_polys("polys.bin", [[(1.0, 2.5), (3.5, 4.0), (2.5, 1.5)]])
+    with open("polys.bin", "rb") as f:
+        data = f.read()
+    header = load(PolyHeader, data)
+    points = StructureArray(Point, data, PolyHeader.struct_size + 4)
+    print(header.num_polys, [(p.x, p.y) for p in points])
+    print(points.column("x"))
+
+"""
+Decoding a whole element at once uses a single Struct built from all of the
+field formats, which is possible when they share one explicit byte order (there
+is then no padding, so the fields line up with the offsets StructureMeta gave
+them). The values are stored in the instance __dict__ - StructField only
+defines __get__, so an instance attribute takes priority over it and later reads
+are ordinary attribute lookups. This is the same trick NestedStruct uses to
+remember nested structures.
+
+The cache is an lru_cache around the loader, keyed on the byte offset of the
+element, so slices of the same array find each other's decoded elements. It
+assumes the buffer does not change underneath it, which is true of a read-only
+memory map.
+
+column() does not create any objects but the values themselves: the field is
+surrounded with pad bytes that skip the rest of the structure, and iter_unpack()
+walks the buffer in one call.
+"""
@@ -0,0 +1,143 @@
+"""
+This script shows how to write a large number of records as binary structures
+without making a bytes object and a write() call per record.
+
+write_records() in reading_and_writing_binary_arrays_of_structures.py calls
+f.write(record_struct.pack(*r)) for each tuple. Instead, a whole batch of
+records can be packed with a single pack_into() call into a bytearray that is
+allocated once and reused, which is then written out in one large block.
+"""
+import struct
+import sys
+from itertools import chain, islice
+
+
+def _batch_writer(records, format, f, batch_size):
+    """
+    Pack an iterable of record tuples, batch_size records at a time,
+    and write each batch out.
+    """
+    record_struct = struct.Struct(format)
+    byte_order = format[0] if format[:1] in ('<', '>', '!', '=', '@') else ''
+    codes = format[len(byte_order):]
+    nfields = len(record_struct.unpack(bytes(record_struct.size)))
+    if struct.calcsize(byte_order + codes * 2) != 2 * record_struct.size:
+        # Native alignment would pad between the records of a batch, which
+        # a file written one record at a time does not have
+        raise ValueError('Records of {!r} are not a whole number of alignment units - '
+                         'give an explicit byte order such as {!r}'.format(format, '<' + codes))
+
+    # A single struct covering a whole batch of records
+    batch_struct = struct.Struct(byte_order + codes * batch_size)
+    buf = bytearray(batch_struct.size)
+    view = memoryview(buf)
+
+    records = iter(records)
+    written = 0
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        # Once flattened a record of the wrong length would shift every field
+        # after it, so check them all first - in C, with one set()
+        if set(map(len, batch)) != {nfields}:
+            for n, record in enumerate(batch, written):
+                if len(record) != nfields:
+                    raise struct.error('record {} has {} fields, expected {}'.format(
+                        n, len(record), nfields))
+        if len(batch) == batch_size:
+            batch_struct.pack_into(buf, 0, *chain.from_iterable(batch))
+            f.write(view)
+        else:
+            tail_struct = struct.Struct(byte_order + codes * len(batch))
+            tail_struct.pack_into(buf, 0, *chain.from_iterable(batch))
+            f.write(view[:tail_struct.size])
+        written += len(batch)
+
+
+def write_records_bulk(records, format, f, batch_size=4096):
+    """
+    Write a sequence of tuples to a binary file of structures, batch_size
+    records at a time.
+    """
+    _batch_writer(records, format, f, batch_size)
+
+
+def write_columns(columns, format, f, batch_size=4096):
+    """
+    Write records given as one iterable per field (such as all the ints and
+    all the floats) without building the record tuples first.
+    """
+    # strict, so that columns of different lengths are an error rather than
+    # all being cut down to the shortest
+    _batch_writer(zip(*columns, strict=True), format, f, batch_size)
+
+
+# Usage and a comparison with write_records()
+if __name__ == '__main__':
+    import io
+    import time
+
+    def write_records(records, format, f):
+        record_struct = struct.Struct(format)
+        for r in records:
+            f.write(record_struct.pack(*r))
+
+    records = [(1, 2.3, 4.5),
+               (6, 7.8, 9.0),
+               (12, 13.4, 56.7)]
+
+    with open('data.b', 'wb') as f:
+        write_records_bulk(records, '<idd', f)
+
+    kinds = [1, 6, 12]
+    xs = [2.3, 7.8, 13.4]
+    ys = [4.5, 9.0, 56.7]
+    with open('data.b', 'wb') as f:
+        write_columns([kinds, xs, ys], '<idd', f)
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+    kinds = list(range(n))
+    xs = [float(i) for i in range(n)]
+    ys = [i * 0.5 for i in range(n)]
+    records = list(zip(kinds, xs, ys))
+
+    for name, func, data in [('write_records', write_records, records),
+                             ('write_records_bulk', write_records_bulk, records),
+                             ('write_columns', write_columns, [kinds, xs, ys])]:
+        f = io.BufferedWriter(io.FileIO('data.b', 'w'))
+        start = time.perf_counter()
+        func(data, '<idd', f)
+        f.close()
+        elapsed = time.perf_counter() - start
+        print('{:20} {:.2f}s {:,.0f} records/sec'.format(name, elapsed, n / elapsed))
+
+"""
+Writing 10 million '<idd' records to a file on a single core:
+
+    write_records        4.68s  2,138,859 records/sec
+    write_records_bulk   1.79s  5,592,628 records/sec
+    write_columns        1.87s  5,353,835 records/sec
+
+The gain comes from two places. pack_into() fills the preallocated buffer in
+place, so there is no new bytes object per record, and the buffer goes to
+write() as a memoryview so it is not copied either. Packing a whole batch
+with one Struct also means the loop over the records and their fields runs
+in C rather than as a Python for loop - chain.from_iterable() flattens the
+tuples (or the zipped columns) into the argument list of a single call.
+
+Native formats ('@' or no prefix) align each field, and repeating the codes
+in one Struct would put padding between records wherever a record is not a
+multiple of its alignment - '@di' is 12 bytes alone but 16 in a batch. Those
+formats are rejected, so a file written in bulk always has the same layout
+as one written by write_records().
+
+Record boundaries are lost once the tuples are flattened, so the lengths of
+each batch of records are checked first with set(map(len, batch)) - a record
+of the wrong length raises struct.error, just as record_struct.pack() does
+in write_records(). write_columns() zips the columns with strict=True
+(Python 3.10 and later) so columns of different lengths raise ValueError.
+
+Keep batch_size moderate - the batch Struct is compiled once, but every
+field of the batch becomes an argument to pack_into().
+"""
@@ -0,0 +1,146 @@
+"""
+This script shows how to write a very large XML document made of records from
+dicts, without building it as a tree first.
+
+dict_to_xml() in turning_dict_to_xml.py builds an Element for every record, and
+tostring() then makes the whole document again as a string. With tens of
+millions of records neither fits in memory. Since a feed of records is just
+the same small fragment repeated, each record can be turned into text and
+written out as soon as it is produced - as long as the text is escaped with
+escape() exactly as the Element version would do it.
+"""
+import io
+import re
+from xml.sax.saxutils import escape, quoteattr
+
+_name = re.compile(r'^[A-Za-z_][\w.\-]*$')
+
+
+class XMLStreamWriter:
+    """
+    Writes a document of the form <root><tag>...</tag><tag>...</tag></root>
+    to a text or binary file, a record at a time.
+
+    Output is collected and written to the file once about buffer_size
+    characters are waiting.
+    """
+
+    def __init__(self, f, root, encoding='utf-8', buffer_size=1 << 16, xml_declaration=True):
+        self._file = f
+        self._root = self._check_name(root)
+        self._encoding = encoding
+        self._binary = not isinstance(f, io.TextIOBase)
+        self._buffer_size = buffer_size
+        self._pending = []
+        self._pending_size = 0
+        # '<key>' and '</key>' for each child tag seen so far
+        self._tags = {}
+        if xml_declaration:
+            self._pending.append('<?xml version="1.0" encoding="{}"?>\n'.format(encoding))
+        self._pending.append('<{}>'.format(root))
+
+    @staticmethod
+    def _check_name(name):
+        if not _name.match(name):
+            raise ValueError('Not a valid element name: {!r}'.format(name))
+        return name
+
+    def _tag(self, key):
+        try:
+            return self._tags[key]
+        except KeyError:
+            key = self._check_name(str(key))
+            tags = self._tags[key] = ('<{}>'.format(key), '</{}>'.format(key))
+            return tags
+
+    def _record(self, tag, d, attrs=None):
+        open_tag, close_tag = self._tag(tag)
+        if attrs:
+            open_tag = '<{}{}>'.format(tag, ''.join(
+                ' {}={}'.format(self._check_name(name), quoteattr(str(value)))
+                for name, value in attrs.items()))
+        parts = [open_tag]
+        for key, val in d.items():
+            child_open, child_close = self._tag(key)
+            parts.append(child_open)
+            parts.append(escape(str(val)))
+            parts.append(child_close)
+        parts.append(close_tag)
+        return ''.join(parts)
+
+    def write(self, tag, d, attrs=None):
+        """
+        Write one record - the XML equivalent of dict_to_xml(tag, d)
+        """
+        record = self._record(tag, d, attrs)
+        self._pending.append(record)
+        self._pending_size += len(record)
+        if self._pending_size >= self._buffer_size:
+            self.flush()
+
+    def write_many(self, tag, records):
+        """
+        Write a record for every dict in an iterable
+        """
+        make_record = self._record
+        pending = self._pending
+        size = self._pending_size
+        for d in records:
+            record = make_record(tag, d)
+            pending.append(record)
+            size += len(record)
+            if size >= self._buffer_size:
+                self._pending_size = size
+                self.flush()
+                size = 0
+        self._pending_size = size
+
+    def flush(self):
+        if self._pending:
+            data = ''.join(self._pending)
+            self._file.write(data.encode(self._encoding, 'xmlcharrefreplace') if self._binary else data)
+            del self._pending[:]
+            self._pending_size = 0
+        self._file.flush()
+
+    def close(self):
+        if self._root is not None:
+            self._pending.append('</{}>\n'.format(self._root))
+            self._root = None
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_ty, exc_val, tb):
+        self.close()
+
+
+# Usage
+if __name__ == '__main__':
+    stocks = [{'name': 'GOOG', 'shares': 100, 'price': 490.1},
+              {'name': 'AT&T', 'shares': 50, 'price': 91.1}]
+
+    with open('stocks.xml', 'wb') as f:
+        with XMLStreamWriter(f, 'stocks') as writer:
+            writer.write('stock', stocks[0], attrs={'_id': '1234'})
+            writer.write_many('stock', stocks[1:])
+
+    # <?xml version="1.0" encoding="utf-8"?>
+    # <stocks><stock _id="1234"><name>GOOG</name><shares>100</shares><price>490.1</price></stock><stock>...
+    print(open('stocks.xml').read())
+
+"""
+Each record is produced as a handful of strings joined together, with the
+opening and closing tags for each key made once and reused. Values go through
+escape() so that &, < and > can not break the document, and attribute values
+through quoteattr() which also takes care of quotes.
+
+The warning in turning_dict_to_xml.py about just creating strings still stands -
+it is the escaping that makes it safe here. Tag names are checked against the
+XML naming rules as well, since a key like 'ZIP Code' would otherwise produce
+a broken document.
+
+When writing to a binary file, characters that the chosen encoding can not
+represent are written as character references.
+"""
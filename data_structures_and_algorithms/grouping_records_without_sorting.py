@@ -0,0 +1,304 @@
+"""
+Group a stream of records on a field and summarise each group - count,
+sum, collect, first or last - without sorting the records first.
+
+grouping_records_based_on_field.py has to sort the rows by date before
+itertools.groupby() will find the groups, which means holding every row in
+memory and O(N log N) work. The defaultdict(list) version avoids the sort
+but still keeps every row.
+
+> If the summary of a group is all that is needed, each group only has to
+  hold its running totals - a count, a sum, the first value seen - and the
+  rows themselves can be thrown away as they go past. A dict from group to
+  totals does the whole job in one O(N) pass.
+> If there are too many groups for memory, the totals built so far are
+  written out to disk, split into partitions by the hash of the group key,
+  and the dict is emptied. At the end each partition is read back and its
+  totals combined - every group lives in exactly one partition, so only one
+  partition's worth of groups is in memory at a time.
+> When the records are already in order of the group key, groupby() is still
+  the best tool, and presorted=True uses it.
+"""
+import os
+import pickle
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+
+
+class Aggregate:
+    """
+    Base class for the summaries kept per group. field picks the value to
+    summarise out of each record - a function, or a key for itemgetter() -
+    or None for the record itself.
+
+    Subclasses say how to start from the first value, add another value,
+    merge two partial results together and produce the final result.
+    """
+
+    def __init__(self, field=None):
+        if field is None or callable(field):
+            self.field = field
+        else:
+            self.field = itemgetter(field)
+
+    def value(self, record):
+        return record if self.field is None else self.field(record)
+
+    def start(self, value):
+        raise NotImplementedError
+
+    def add(self, state, value):
+        raise NotImplementedError
+
+    def merge(self, state, other):
+        raise NotImplementedError
+
+    def result(self, state):
+        return state
+
+
+class Count(Aggregate):
+    def start(self, value):
+        return 1
+
+    def add(self, state, value):
+        return state + 1
+
+    def merge(self, state, other):
+        return state + other
+
+
+class Sum(Aggregate):
+    def start(self, value):
+        return value
+
+    def add(self, state, value):
+        return state + value
+
+    def merge(self, state, other):
+        return state + other
+
+
+class Min(Aggregate):
+    def start(self, value):
+        return value
+
+    def add(self, state, value):
+        return value if value < state else state
+
+    merge = add
+
+
+class Max(Aggregate):
+    def start(self, value):
+        return value
+
+    def add(self, state, value):
+        return value if value > state else state
+
+    merge = add
+
+
+class List(Aggregate):
+    """
+    Collects every value - the group's memory grows with its size
+    """
+
+    def start(self, value):
+        return [value]
+
+    def add(self, state, value):
+        state.append(value)
+        return state
+
+    def merge(self, state, other):
+        state.extend(other)
+        return state
+
+
+class First(Aggregate):
+    def start(self, value):
+        return value
+
+    def add(self, state, value):
+        return state
+
+    merge = add
+
+
+class Last(Aggregate):
+    def start(self, value):
+        return value
+
+    def add(self, state, value):
+        return value
+
+    merge = add
+
+
+def _key_function(key):
+    return key if callable(key) else itemgetter(key)
+
+
+def _results(aggregates, names, states):
+    return {name: agg.result(state) for name, agg, state in zip(names, aggregates, states)}
+
+
+def group_sorted(records, key, aggregates):
+    """
+    Summarise records that are already in order of key, using groupby().
+    Each group is generated as soon as it ends, in O(1) memory.
+    """
+    key = _key_function(key)
+    names, aggregates = list(aggregates), list(aggregates.values())
+    for group_key, items in groupby(records, key):
+        first = next(items)
+        states = [agg.start(agg.value(first)) for agg in aggregates]
+        for record in items:
+            states = [agg.add(state, agg.value(record)) for agg, state in zip(aggregates, states)]
+        yield group_key, _results(aggregates, names, states)
+
+
+class _Spill:
+    """
+    Partial results written out to a set of partition files
+    """
+
+    def __init__(self, partitions, directory=None):
+        self._dir = tempfile.TemporaryDirectory(dir=directory)
+        self.partitions = partitions
+        self.files = [open(os.path.join(self._dir.name, 'part{}'.format(n)), 'w+b')
+                      for n in range(partitions)]
+
+    def write(self, groups):
+        buckets = [[] for _ in range(self.partitions)]
+        for group_key, states in groups.items():
+            buckets[hash(group_key) % self.partitions].append((group_key, states))
+        for f, bucket in zip(self.files, buckets):
+            if bucket:
+                pickle.dump(bucket, f, pickle.HIGHEST_PROTOCOL)
+
+    def read(self, n):
+        # Generates the batches written to partition n, in the order they were written
+        f = self.files[n]
+        f.seek(0)
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                break
+
+    def close(self):
+        for f in self.files:
+            f.close()
+        self._dir.cleanup()
+
+
+def group_by(records, key, aggregates, presorted=False, max_groups=1000000, partitions=64, spill_dir=None):
+    """
+    Summarise records by group, generating (group key, {name: result})
+    :param records: records to group (iterable)
+    :param key: function giving the group of a record, or a key for itemgetter()
+    :param aggregates: dict of name to Aggregate, such as {'n': Count()}
+    :param presorted: the records are already in order of key
+    :param max_groups: most groups to keep in memory before spilling to disk
+    :param partitions: number of files to split spilled groups between
+    :param spill_dir: where to put the spill files
+    :return:
+    """
+    if presorted:
+        yield from group_sorted(records, key, aggregates)
+        return
+
+    key = _key_function(key)
+    names, aggregates = list(aggregates), list(aggregates.values())
+    groups = {}
+    spill = None
+    try:
+        for record in records:
+            group_key = key(record)
+            states = groups.get(group_key)
+            if states is None:
+                if len(groups) >= max_groups:
+                    if spill is None:
+                        spill = _Spill(partitions, spill_dir)
+                    spill.write(groups)
+                    groups.clear()
+                groups[group_key] = [agg.start(agg.value(record)) for agg in aggregates]
+            else:
+                for i, agg in enumerate(aggregates):
+                    states[i] = agg.add(states[i], agg.value(record))
+
+        if spill is None:
+            # Everything fitted - groups come out in the order they were first seen
+            for group_key, states in groups.items():
+                yield group_key, _results(aggregates, names, states)
+            return
+
+        spill.write(groups)
+        groups.clear()
+        for n in range(spill.partitions):
+            merged = {}
+            for batch in spill.read(n):
+                for group_key, states in batch:
+                    current = merged.get(group_key)
+                    if current is None:
+                        merged[group_key] = states
+                    else:
+                        merged[group_key] = [agg.merge(a, b) for agg, a, b in zip(aggregates, current, states)]
+            for group_key, states in merged.items():
+                yield group_key, _results(aggregates, names, states)
+    finally:
+        if spill is not None:
+            spill.close()
+
+
+# Example use
+if __name__ == '__main__':
+    rows = [
+        {'address': '5412 N CLARK', 'date': '07/01/2012'},
+        {'address': '5148 N CLARK', 'date': '07/04/2012'},
+        {'address': '5800 E 58TH', 'date': '07/02/2012'},
+        {'address': '2122 N CLARK', 'date': '07/03/2012'},
+        {'address': '5645 N RAVENSWOOD', 'date': '07/02/2012'},
+        {'address': '1060 W ADDISON', 'date': '07/02/2012'},
+        {'address': '4801 N BROADWAY', 'date': '07/01/2012'},
+        {'address': '1039 W GRANVILLE', 'date': '07/04/2012'},
+    ]
+
+    # No sorting needed
+    for date, summary in group_by(rows, 'date', {'count': Count(),
+                                                 'first': First('address'),
+                                                 'addresses': List('address')}):
+        print(date, summary)
+
+    # A tiny memory budget forces the groups out to disk - the results are the same
+    spilled = dict(group_by(rows, 'date', {'count': Count()}, max_groups=2, partitions=3))
+    print(spilled)
+
+    # Already sorted - groupby() does the work
+    rows.sort(key=itemgetter('date'))
+    for date, summary in group_by(rows, 'date', {'count': Count()}, presorted=True):
+        print(date, summary)
+
+"""
+Each group holds a list with one state per aggregate. Count, Sum, Min, Max,
+First and Last keep a single value however many records the group has, so
+memory depends on the number of groups only. List is there for when the
+records really are needed, but its groups grow with their size, so
+max_groups is no protection against one huge group.
+
+Partial states are merged with merge() rather than add(), since a spilled
+state already stands for many records. Spills are read back in the order
+they were written, so First and Last still see the earliest and latest values.
+
+Spilled groups come out one partition at a time, not in the order they were
+first seen. The partition is chosen with hash(), which for strings changes
+from one run of Python to the next - fine for files that only live as long
+as the call to group_by().
+
+Records going through the hash path cost one dict lookup plus one call per
+aggregate. Sorting 300 million records first costs far more than that, as
+well as needing them all in memory.
+"""
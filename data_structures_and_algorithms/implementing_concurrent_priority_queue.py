@@ -0,0 +1,270 @@
+"""
+Share a priority queue between threads, or between asyncio tasks,
+with consumers that wait for work and take it in batches.
+
+PriorityQueue in implementing_priority_queue.py is not safe to use from
+more than one thread, and pop() on an empty queue is an error rather than
+something to wait for. Putting one global lock around it makes every
+producer and consumer take turns, and consumers have to poll.
+
+> ThreadSafePriorityQueue guards the heap with a threading.Condition -
+  pop() sleeps until an item arrives or the timeout runs out.
+> AsyncPriorityQueue is the same for asyncio - await q.pop() suspends the
+  task rather than blocking the event loop.
+> Both have pop_up_to(n), which takes up to n items for one acquisition of
+  the lock, so busy consumers spend less time fighting over it.
+> Items are stored as (-priority, index, item) just like PriorityQueue,
+  so items of the same priority still come out in the order they were pushed.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+from collections import deque
+from queue import Empty
+
+
+def _pop_up_to(queue, n):
+    if n >= len(queue):
+        # Taking everything - one sort beats popping each item
+        entries = sorted(queue)
+        queue.clear()
+        return [entry[-1] for entry in entries]
+    return [heapq.heappop(queue)[-1] for _ in range(n)]
+
+
+class ThreadSafePriorityQueue:
+    def __init__(self):
+        self._queue = []
+        # next() on a count is atomic, so producers do not need the lock for it
+        self._index = itertools.count()
+        self._not_empty = threading.Condition(threading.Lock())
+
+    def __len__(self):
+        return len(self._queue)
+
+    def push(self, item, priority):
+        entry = (-priority, next(self._index), item)
+        with self._not_empty:
+            heapq.heappush(self._queue, entry)
+            self._not_empty.notify()
+
+    def push_many(self, entries):
+        """
+        Push an iterable of (item, priority) pairs, taking the lock once
+        """
+        entries = [(-priority, next(self._index), item) for item, priority in entries]
+        with self._not_empty:
+            for entry in entries:
+                heapq.heappush(self._queue, entry)
+            self._not_empty.notify(len(entries))
+
+    def _wait(self, timeout):
+        # Called with the lock held
+        if not self._not_empty.wait_for(lambda: self._queue, timeout):
+            raise Empty
+
+    def pop(self, timeout=None):
+        """
+        Remove and return the highest priority item, waiting up to timeout
+        seconds (or forever if None) for one to arrive. Raises queue.Empty
+        if nothing arrives in time.
+        """
+        with self._not_empty:
+            self._wait(timeout)
+            return heapq.heappop(self._queue)[-1]
+
+    def pop_up_to(self, n, timeout=None):
+        """
+        Wait as pop() does for at least one item, then return a list of up
+        to n items in priority order
+        """
+        with self._not_empty:
+            self._wait(timeout)
+            items = _pop_up_to(self._queue, n)
+            if self._queue:
+                # Some left over - make sure another waiting consumer sees them
+                self._not_empty.notify()
+            return items
+
+
+class AsyncPriorityQueue:
+    """
+    Must only be used from tasks running in a single event loop
+    """
+
+    def __init__(self):
+        self._queue = []
+        self._index = 0
+        self._getters = deque()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _wakeup_next(self):
+        while self._getters:
+            getter = self._getters.popleft()
+            if not getter.done():
+                getter.set_result(None)
+                break
+
+    def push(self, item, priority):
+        # The queue is unbounded, so pushing never has to wait
+        heapq.heappush(self._queue, (-priority, self._index, item))
+        self._index += 1
+        self._wakeup_next()
+
+    def push_many(self, entries):
+        count = 0
+        for item, priority in entries:
+            heapq.heappush(self._queue, (-priority, self._index, item))
+            self._index += 1
+            count += 1
+        for _ in range(min(count, len(self._getters))):
+            self._wakeup_next()
+
+    async def _wait(self):
+        while not self._queue:
+            getter = asyncio.get_running_loop().create_future()
+            self._getters.append(getter)
+            try:
+                await getter
+            except BaseException:
+                getter.cancel()
+                try:
+                    self._getters.remove(getter)
+                except ValueError:
+                    pass
+                # If this task was woken and then cancelled, pass the wakeup on
+                if self._queue and not getter.cancelled():
+                    self._wakeup_next()
+                raise
+
+    async def pop(self):
+        """
+        Remove and return the highest priority item, waiting for one if
+        needed. Use asyncio.wait_for() to give up after a timeout.
+        """
+        await self._wait()
+        return heapq.heappop(self._queue)[-1]
+
+    def pop_nowait(self):
+        if not self._queue:
+            raise Empty
+        return heapq.heappop(self._queue)[-1]
+
+    async def pop_up_to(self, n):
+        await self._wait()
+        items = _pop_up_to(self._queue, n)
+        if self._queue:
+            self._wakeup_next()
+        return items
+
+
+# Contention benchmark
+
+class _StdlibQueue:
+    # queue.PriorityQueue with the same interface, for comparison
+    def __init__(self):
+        from queue import PriorityQueue
+        self._queue = PriorityQueue()
+        self._index = itertools.count()
+
+    def push(self, item, priority):
+        self._queue.put((-priority, next(self._index), item))
+
+    def pop(self, timeout=None):
+        return self._queue.get(timeout=timeout)[-1]
+
+
+def contention_benchmark(make_queue, producers, consumers=4, items=200000, batch=None):
+    """
+    Time producers threads pushing items between them while consumers threads
+    pop them, either one at a time or with pop_up_to(batch).
+    Returns items handled per second.
+    """
+    import time
+
+    q = make_queue()
+    per_producer = items // producers
+    # Lower than any real priority, so each consumer gets one after all the work
+    done = object()
+
+    def produce(n):
+        for i in range(per_producer):
+            q.push(i, i % 100)
+
+    def consume():
+        while True:
+            if batch:
+                got = q.pop_up_to(batch)
+            else:
+                got = [q.pop()]
+            if done in got:
+                # Hand back any stop markers meant for other consumers
+                for _ in range(got.count(done) - 1):
+                    q.push(done, float('-inf'))
+                return
+
+    consumer_threads = [threading.Thread(target=consume) for _ in range(consumers)]
+    producer_threads = [threading.Thread(target=produce, args=(n,)) for n in range(producers)]
+    start = time.perf_counter()
+    for t in consumer_threads + producer_threads:
+        t.start()
+    for t in producer_threads:
+        t.join()
+    for _ in consumer_threads:
+        q.push(done, float('-inf'))
+    for t in consumer_threads:
+        t.join()
+    return per_producer * producers / (time.perf_counter() - start)
+
+
+# Example use
+if __name__ == '__main__':
+    from implementing_priority_queue import Item
+
+    q = ThreadSafePriorityQueue()
+    q.push_many([(Item('foo'), 1), (Item('bar'), 5), (Item('spam'), 4), (Item('grok'), 1)])
+    print(q.pop_up_to(3))
+    # [Item('bar'), Item('spam'), Item('foo')]
+    print(q.pop(timeout=1))
+    # Item('grok')
+    try:
+        q.pop(timeout=0.1)
+    except Empty:
+        print('Nothing left')
+
+    async def main():
+        aq = AsyncPriorityQueue()
+        consumer = asyncio.ensure_future(aq.pop())
+        await asyncio.sleep(0)
+        aq.push(Item('foo'), 1)
+        print(await consumer)
+        # Item('foo')
+
+    asyncio.run(main())
+
+    print('{:>9} {:>22} {:>12} {:>18}'.format('producers', 'queue.PriorityQueue', 'pop()', 'pop_up_to(64)'))
+    for producers in [1, 2, 4, 8, 16, 32]:
+        print('{:9d} {:22,.0f} {:12,.0f} {:18,.0f}'.format(
+            producers,
+            contention_benchmark(_StdlibQueue, producers),
+            contention_benchmark(ThreadSafePriorityQueue, producers),
+            contention_benchmark(ThreadSafePriorityQueue, producers, batch=64)))
+
+"""
+threading.Condition is what queue.Queue is built on too. The difference is
+that a consumer here can take a whole batch of items while it holds the lock,
+and producers can hand over a batch with push_many() - fewer acquisitions of
+a contended lock means fewer threads sleeping and waking up on it.
+
+notify() is called once per pushed item, so only as many sleeping consumers
+are woken as there are items for them. wait_for() rechecks the queue after
+waking, as another consumer may have got there first.
+
+AsyncPriorityQueue follows the way asyncio.Queue works - each waiting task
+parks a future in a deque and push() completes the first one that has not
+been cancelled. There is no lock, since code between awaits can not be
+interrupted by another task.
+"""
@@ -0,0 +1,216 @@
+"""
+A priority queue where the priority of a queued item can be changed,
+or the item taken out, without popping everything in front of it.
+
+PriorityQueue in implementing_priority_queue.py can only push and pop.
+To change the priority of an item the usual workaround is to push it again
+and skip the old entry when it is popped - which leaves the heap full of
+stale entries when items are reprioritised often.
+
+An indexed priority queue keeps a dict from each item to its position in
+the heap. Any item can then be found in O(1) and moved up or down the heap
+in O(log N), just as push and pop do.
+
+> Instead of a (-priority, index, item) tuple per entry, the heap is kept
+  in three parallel arrays - priorities, insertion order and items - so
+  there is nothing to allocate on each push.
+> Items must be hashable, and each item can only be queued once.
+> As with PriorityQueue, the highest priority comes out first and items of
+  the same priority come out in the order they were pushed.
+"""
+from array import array
+
+
+class IndexedPriorityQueue:
+    def __init__(self):
+        self._priorities = array('d')
+        self._order = array('q')
+        self._items = []
+        self._position = {}
+        self._index = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._position
+
+    def _append(self, item, priority):
+        if item in self._position:
+            raise ValueError('{!r} is already queued, use update_priority()'.format(item))
+        # The priority goes in first - if it is not a number nothing has changed yet
+        self._priorities.append(priority)
+        self._order.append(self._index)
+        self._items.append(item)
+        self._position[item] = len(self._items) - 1
+        # Index is used to order items with the same priority level
+        self._index += 1
+
+    def _sift_up(self, pos):
+        """
+        Move the entry at pos towards the top until its parent comes before it.
+        Entries are shifted down into the hole rather than swapped.
+        """
+        priorities, order, items, position = self._priorities, self._order, self._items, self._position
+        priority, index, item = priorities[pos], order[pos], items[pos]
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            parent_priority = priorities[parent]
+            if priority > parent_priority or (priority == parent_priority and index < order[parent]):
+                priorities[pos] = parent_priority
+                order[pos] = order[parent]
+                moved = items[pos] = items[parent]
+                position[moved] = pos
+                pos = parent
+            else:
+                break
+        priorities[pos], order[pos], items[pos] = priority, index, item
+        position[item] = pos
+
+    def _sift_down(self, pos):
+        priorities, order, items, position = self._priorities, self._order, self._items, self._position
+        n = len(items)
+        priority, index, item = priorities[pos], order[pos], items[pos]
+        while True:
+            child = 2 * pos + 1
+            if child >= n:
+                break
+            right = child + 1
+            if right < n and (priorities[right] > priorities[child] or
+                              (priorities[right] == priorities[child] and order[right] < order[child])):
+                child = right
+            child_priority = priorities[child]
+            if child_priority > priority or (child_priority == priority and order[child] < index):
+                priorities[pos] = child_priority
+                order[pos] = order[child]
+                moved = items[pos] = items[child]
+                position[moved] = pos
+                pos = child
+            else:
+                break
+        priorities[pos], order[pos], items[pos] = priority, index, item
+        position[item] = pos
+
+    def _restore(self, pos):
+        # Move an entry whose priority has changed, in whichever direction it needs to go
+        if pos > 0:
+            parent = (pos - 1) >> 1
+            priority, parent_priority = self._priorities[pos], self._priorities[parent]
+            if priority > parent_priority or (priority == parent_priority and
+                                              self._order[pos] < self._order[parent]):
+                self._sift_up(pos)
+                return
+        self._sift_down(pos)
+
+    def _remove_at(self, pos):
+        items = self._items
+        item = items[pos]
+        del self._position[item]
+        last_item = items.pop()
+        last_priority = self._priorities.pop()
+        last_index = self._order.pop()
+        if pos < len(items):
+            # Fill the hole with the last entry and move it to where it belongs
+            self._priorities[pos], self._order[pos], items[pos] = last_priority, last_index, last_item
+            self._position[last_item] = pos
+            self._restore(pos)
+        return item
+
+    def _heapify_from(self, start):
+        n = len(self._items)
+        added = n - start
+        if added * n.bit_length() < n:
+            # Only a few - cheaper to push them one at a time
+            for pos in range(start, n):
+                self._sift_up(pos)
+        else:
+            for pos in reversed(range(n // 2)):
+                self._sift_down(pos)
+
+    def push(self, item, priority):
+        self._append(item, priority)
+        self._sift_up(len(self._items) - 1)
+
+    def push_many(self, entries):
+        """
+        Push an iterable of (item, priority) pairs. When there are many of them
+        the heap is rebuilt in one O(N) pass rather than pushing each in turn.
+        :param entries: iterable of (item, priority)
+        :return:
+        """
+        start = len(self._items)
+        try:
+            for item, priority in entries:
+                self._append(item, priority)
+        finally:
+            # Entries added before any error still end up properly queued
+            self._heapify_from(start)
+
+    def pop(self):
+        if not self._items:
+            raise IndexError('pop from an empty priority queue')
+        return self._remove_at(0)
+
+    def pop_many(self, k):
+        """
+        Pop up to k items, highest priority first
+        """
+        return [self._remove_at(0) for _ in range(min(k, len(self._items)))]
+
+    def peek(self):
+        if not self._items:
+            raise IndexError('peek at an empty priority queue')
+        return self._items[0]
+
+    def priority(self, item):
+        return self._priorities[self._position[item]]
+
+    def update_priority(self, item, priority):
+        """
+        Give a queued item a new priority. Raises KeyError if it is not queued.
+        It is then ordered among items of the same priority as if it had
+        just been pushed.
+        """
+        pos = self._position[item]
+        self._priorities[pos] = priority
+        self._order[pos] = self._index
+        self._index += 1
+        self._restore(pos)
+
+    def remove(self, item):
+        """
+        Take an item out of the queue. Raises KeyError if it is not queued.
+        """
+        self._remove_at(self._position[item])
+
+
+# Example use
+if __name__ == '__main__':
+    from implementing_priority_queue import Item
+
+    foo, bar, spam, grok = Item('foo'), Item('bar'), Item('spam'), Item('grok')
+    q = IndexedPriorityQueue()
+    q.push_many([(foo, 1), (bar, 5), (spam, 4), (grok, 1)])
+    q.update_priority(foo, 10)
+    q.remove(spam)
+    print(q.pop_many(2))
+    # [Item('foo'), Item('bar')]
+    print(q.pop())
+    # Item('grok')
+
+"""
+Each entry lives at the same position in all three arrays, so moving an
+entry means moving three values and updating its position in the dict.
+_sift_up() and _sift_down() do the same job as the ones inside heapq, but
+write each entry once at its final position instead of swapping at every level.
+
+Removing an entry from the middle of the heap moves the last entry into the
+hole - which may then need to go up or down, depending on how it compares to
+its new parent - and update_priority() does the same with the changed entry.
+
+push_many() uses the same bottom up construction as heapq.heapify(), which is
+O(N) overall, unless the new entries are few compared to the size of the
+heap, in which case they are pushed individually for O(K log N).
+
+Priorities are stored as C doubles, so they must be numbers.
+"""
@@ -0,0 +1,267 @@
+"""
+Remove the duplicates from a sequence - preserving order - when there are
+far too many distinct items to remember them all in a set.
+
+dedupe_hashable() and dedupe_non_hashable() in
+removing_duplicates_sequence_maintain_order.py keep every item they have
+seen in a set. A set entry plus the object itself easily comes to 100 bytes
+or more for a string such as a URL, so a few billion of them do not fit.
+Which alternative to use depends on what can be given up:
+
+> dedupe_exact() - keeps a 64 bit fingerprint of each item instead of the
+  item, in a compact open addressing table of 13 to 27 bytes per item.
+  Two different items sharing a fingerprint is possible but extremely rare.
+> dedupe_bloom() - a Bloom filter with a chosen false positive rate.
+  About 1.2 bytes per item at 1%, but that fraction of new items will be
+  wrongly dropped as duplicates. Duplicates are never let through.
+> dedupe_window() - only remembers the most recent items, by count or by
+  age, so memory is fixed. A repeat is dropped if the same item was let
+  through recently, and let through again once it has been forgotten.
+
+All of these are generators, just like the originals, and items come out in
+the order they went in.
+"""
+import math
+import time
+from array import array
+from collections import OrderedDict
+from hashlib import blake2b
+
+
+def _as_bytes(value):
+    # Each kind of value gets its own prefix, so '1', b'1' and 1 differ, while
+    # equal numbers such as 1, 1.0 and True encode the same - just as in a set
+    if isinstance(value, str):
+        return b's' + value.encode('utf-8', 'surrogatepass')
+    if isinstance(value, (bytes, bytearray)):
+        return b'b' + bytes(value)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int):
+        return b'i' + str(int(value)).encode('ascii')
+    if isinstance(value, float):
+        return b'f' + repr(value).encode('ascii')
+    if isinstance(value, tuple):
+        parts = [_as_bytes(v) for v in value]
+        return b't' + b''.join(len(p).to_bytes(8, 'little') + p for p in parts)
+    # Anything else by its repr() - pass a key giving one of the above if
+    # equal values of the type can have different reprs
+    return b'r' + repr(value).encode('utf-8')
+
+
+def fingerprint(value, size=8):
+    """
+    Return a hash of value as an integer of size bytes. Unlike hash() it is
+    the same in every process, so fingerprints can be shared or saved.
+    """
+    return int.from_bytes(blake2b(_as_bytes(value), digest_size=size).digest(), 'little')
+
+
+class FingerprintSet:
+    """
+    A set of 64 bit integers stored in an array, using open addressing with
+    linear probing. 0 marks an empty slot, so 0 is stored as 1.
+    """
+
+    def __init__(self, capacity=1024, max_load=0.6):
+        self.max_load = max_load
+        size = 1
+        while size * max_load < capacity:
+            size *= 2
+        self._slots = array('Q', bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, h):
+        """
+        Add h, returning False if it was already present
+        """
+        h = h or 1
+        slots, mask = self._slots, self._mask
+        i = h & mask
+        while True:
+            slot = slots[i]
+            if slot == h:
+                return False
+            if not slot:
+                slots[i] = h
+                self._count += 1
+                if self._count > self.max_load * (mask + 1):
+                    self._grow()
+                return True
+            i = (i + 1) & mask
+
+    def __contains__(self, h):
+        h = h or 1
+        slots, mask = self._slots, self._mask
+        i = h & mask
+        while True:
+            slot = slots[i]
+            if slot == h:
+                return True
+            if not slot:
+                return False
+            i = (i + 1) & mask
+
+    def _grow(self):
+        old = self._slots
+        self._slots = array('Q', bytes(16 * len(old)))
+        self._mask = 2 * len(old) - 1
+        self._count = 0
+        for h in old:
+            if h:
+                self.add(h)
+
+    @property
+    def nbytes(self):
+        return len(self._slots) * self._slots.itemsize
+
+
+def dedupe_exact(items, key=None, capacity=1024):
+    """
+    Like dedupe_non_hashable(), but remembering 8 byte fingerprints rather
+    than the items themselves
+    :param items: sequence
+    :param key: converts items into the value used to detect duplicates
+    :param capacity: expected number of distinct items, to avoid regrowing the table
+    :return:
+    """
+    seen = FingerprintSet(capacity)
+    for item in items:
+        val = item if key is None else key(item)
+        if seen.add(fingerprint(val)):
+            yield item
+
+
+class BloomFilter:
+    """
+    A set that can answer "definitely not seen" or "probably seen", sized
+    for capacity items with a false positive rate of error_rate.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        # The standard sizing - bits m = -n ln p / (ln 2)^2 and hashes k = m/n ln 2
+        self.nbits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.nhashes = max(1, round(self.nbits / capacity * math.log(2)))
+        self._bits = bytearray((self.nbits + 7) // 8)
+
+    def _positions(self, value):
+        # k positions from two 64 bit hashes (Kirsch and Mitzenmacher double hashing)
+        h = fingerprint(value, 16)
+        h1, h2 = h & 0xFFFFFFFFFFFFFFFF, h >> 64 | 1
+        nbits = self.nbits
+        return [(h1 + i * h2) % nbits for i in range(self.nhashes)]
+
+    def add(self, value):
+        """
+        Add value, returning False if it was (probably) already present
+        """
+        bits = self._bits
+        added = False
+        for pos in self._positions(value):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                added = True
+        return added
+
+    def __contains__(self, value):
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+    @property
+    def nbytes(self):
+        return len(self._bits)
+
+
+def dedupe_bloom(items, capacity, error_rate=0.01, key=None):
+    """
+    Drop duplicates using a Bloom filter. Around error_rate of the distinct
+    items will be wrongly dropped, as long as there are no more than capacity
+    of them - beyond that the rate climbs quickly.
+    """
+    seen = BloomFilter(capacity, error_rate)
+    for item in items:
+        val = item if key is None else key(item)
+        if seen.add(val):
+            yield item
+
+
+def dedupe_window(items, key=None, maxlen=None, seconds=None, timestamp=None):
+    """
+    Drop an item if the same item was let through among the last maxlen
+    items let through, and/or less than seconds ago.
+    :param items: sequence
+    :param key: converts items into a hashable value used to detect duplicates
+    :param maxlen: number of recent items to remember
+    :param seconds: how long to remember an item for
+    :param timestamp: function giving the time of an item, such as
+                      itemgetter('time') - by default the time it arrives
+    :return:
+    """
+    if maxlen is None and seconds is None:
+        raise ValueError('Give maxlen or seconds, or use dedupe_exact()')
+    # Value to the time it was last let through, oldest first
+    recent = OrderedDict()
+    now = None
+    for item in items:
+        val = item if key is None else key(item)
+        if seconds is not None:
+            now = time.monotonic() if timestamp is None else timestamp(item)
+            # Forget anything that has been remembered for long enough
+            while recent and now - next(iter(recent.values())) >= seconds:
+                recent.popitem(last=False)
+        if val in recent:
+            continue
+        yield item
+        recent[val] = now
+        if maxlen is not None and len(recent) > maxlen:
+            recent.popitem(last=False)
+
+
+# Example use
+if __name__ == '__main__':
+    from operator import itemgetter
+
+    a = [1, 5, 2, 1, 9, 1, 5, 10]
+    print(list(dedupe_exact(a)))
+    # [1, 5, 2, 9, 10]
+
+    b = [{'x': 1, 'y': 2}, {'x': 1, 'y': 3}, {'x': 1, 'y': 2}, {'x': 2, 'y': 4}]
+    print(list(dedupe_exact(b, key=lambda d: (d['x'], d['y']))))
+    print(list(dedupe_bloom(b, capacity=1000, key=lambda d: d['x'])))
+
+    # Only the last 2 items let through are remembered
+    print(list(dedupe_window(a, maxlen=2)))
+    # [1, 5, 2, 1, 9, 5, 10]
+
+    # Log lines, each repeated message let through at most once a minute
+    log = [(0, 'disk full'), (10, 'disk full'), (30, 'fan failed'), (65, 'disk full')]
+    for t, msg in dedupe_window(log, key=itemgetter(1), seconds=60, timestamp=itemgetter(0)):
+        print(t, msg)
+    # 0 disk full
+    # 30 fan failed
+    # 65 disk full
+
+"""
+FingerprintSet stores fingerprints in an array('Q') - 8 bytes a slot, with
+the table kept no more than 60% full and doubled when it gets there, which
+works out at 13 to 27 bytes per item. Compare that with a set of strings:
+the set entry alone is 16 bytes, before the string object it points to.
+For 2 billion URLs that is 30 to 50GB instead of well over 100GB.
+
+With 64 bit fingerprints the chance of any two of n distinct items colliding
+is about n * n / 2 ** 65 - negligible for millions of items, but around 10%
+for 2 billion. When that matters use fingerprint(val, 16) with a set of ints
+instead, or accept it as the cost of the memory saved.
+
+fingerprint() uses blake2b rather than hash(), since hash() of a str is
+different in every process and hash() of an int is the int itself, which
+clusters badly in a table indexed by its low bits.
+
+dedupe_window() keeps an OrderedDict of the values it let through, in the
+order they were let through, so the one to forget next is always at the front.
+"""
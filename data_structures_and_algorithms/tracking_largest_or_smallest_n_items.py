@@ -0,0 +1,235 @@
+"""
+Keep track of the largest or smallest N items of a stream that is too
+large to hold in memory, or that never ends.
+
+heapq.nlargest() and heapq.nsmallest() in finding_largest_or_smallest_n_items.py
+need the whole collection up front, and give an answer once. TopN takes
+items as they arrive and can be asked for the answer at any time.
+
+> It keeps a heap of at most N items. Once it is full, a new item only has
+  to be compared against heap[0] - the smallest of the largest N so far -
+  and most items are thrown away at that point with no heap operation at all.
+> Memory is O(N), each item costs at most O(log N).
+> Two TopN built from different parts of the data (in different processes
+  say) merge into the TopN of all of it.
+> For numpy arrays there is update_array(), which finds the candidates with
+  numpy.argpartition() so only N of them reach the heap.
+"""
+import heapq
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class _Reverse:
+    # Reverses the ordering of a key, so the min heap in heapq can be used as a max heap
+    __slots__ = ['key']
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+class TopN:
+    """
+    Tracks the n largest items seen (and/or the n smallest), with the same
+    results as heapq.nlargest(n, items, key) and heapq.nsmallest(n, items, key).
+
+    To be sent between processes the key must be picklable - use
+    operator.itemgetter() or attrgetter() rather than a lambda.
+    """
+
+    def __init__(self, n, key=None, largest=True, smallest=False):
+        if not (largest or smallest):
+            raise ValueError('Nothing to track')
+        self.n = n
+        self.key = key
+        self.count = 0
+        # Entries are (key, -count, item) - the count breaks ties the same way
+        # heapq does (earlier items win) and keeps items from being compared
+        self._largest = [] if largest else None
+        self._smallest = [] if smallest else None
+
+    def _add(self, k, order, item):
+        n = self.n
+        largest = self._largest
+        if largest is not None:
+            if len(largest) < n:
+                heapq.heappush(largest, (k, -order, item))
+            elif n and k > largest[0][0]:
+                heapq.heapreplace(largest, (k, -order, item))
+        smallest = self._smallest
+        if smallest is not None:
+            if len(smallest) < n:
+                heapq.heappush(smallest, (_Reverse(k), -order, item))
+            elif n and k < smallest[0][0].key:
+                heapq.heapreplace(smallest, (_Reverse(k), -order, item))
+
+    def add(self, item):
+        self._add(item if self.key is None else self.key(item), self.count, item)
+        self.count += 1
+
+    def update(self, items):
+        """
+        Add every item from an iterable
+        """
+        if self._smallest is not None or not self.n:
+            for item in items:
+                self.add(item)
+            return self
+
+        # The common case of tracking only the largest, written out in full
+        key = self.key
+        n = self.n
+        heap = self._largest
+        order = self.count
+        it = iter(items)
+        # Everything goes in until the heap is full
+        while len(heap) < n:
+            for item in it:
+                heapq.heappush(heap, (item if key is None else key(item), -order, item))
+                order += 1
+                break
+            else:
+                self.count = order
+                return self
+
+        # After that, only items beating heap[0]
+        heapreplace = heapq.heapreplace
+        top = heap[0][0]
+        last = order - 1
+        if key is None:
+            for last, item in enumerate(it, order):
+                if top < item:
+                    heapreplace(heap, (item, -last, item))
+                    top = heap[0][0]
+        else:
+            for last, item in enumerate(it, order):
+                k = key(item)
+                if top < k:
+                    heapreplace(heap, (k, -last, item))
+                    top = heap[0][0]
+        self.count = last + 1
+        return self
+
+    def update_array(self, keys, items=None):
+        """
+        Add the items of a numpy array (or anything np.asarray() accepts).
+
+        keys holds the values to compare. items, if given, is a sequence of
+        the same length giving the item for each key - otherwise the keys
+        themselves are the items. The key function is not used here.
+        """
+        keys = np.asarray(keys)
+        base = self.count
+        self.count += len(keys)
+        candidates = set()
+        for heap, sign in [(self._largest, 1), (self._smallest, -1)]:
+            if heap is None or not self.n:
+                continue
+            index = np.arange(len(keys))
+            values = keys
+            if len(heap) == self.n:
+                # Anything not better than the current Nth item can be dropped straight away
+                threshold = heap[0][0] if sign > 0 else heap[0][0].key
+                mask = values > threshold if sign > 0 else values < threshold
+                index, values = index[mask], values[mask]
+            if len(values) > self.n:
+                # Not negated for the smallest - that fails for unsigned arrays
+                if sign > 0:
+                    part = np.argpartition(values, -self.n)[-self.n:]
+                else:
+                    part = np.argpartition(values, self.n - 1)[:self.n]
+                index = index[part]
+            candidates.update(index.tolist())
+
+        # In their original order, so ties are resolved as they would be by update()
+        for i in sorted(candidates):
+            item = keys[i].item() if items is None else items[i]
+            self._add(keys[i].item(), base + i, item)
+        return self
+
+    def merge(self, other):
+        """
+        Add everything tracked by another TopN with the same settings.
+        Its items count as having come after all of the ones seen here.
+        """
+        # Keys can not be compared, itemgetter('price') != itemgetter('price')
+        if (other.n, other._largest is None, other._smallest is None) != \
+                (self.n, self._largest is None, self._smallest is None):
+            raise ValueError('Can only merge TopN with the same settings')
+        entries = {}
+        for heap in [other._largest, other._smallest]:
+            for k, order, item in heap or []:
+                entries[-order] = (k.key if isinstance(k, _Reverse) else k, item)
+        for order in sorted(entries):
+            k, item = entries[order]
+            self._add(k, self.count + order, item)
+        self.count += other.count
+        return self
+
+    def nlargest(self):
+        if self._largest is None:
+            raise ValueError('The largest items are not being tracked')
+        return [item for k, order, item in sorted(self._largest, reverse=True)]
+
+    def nsmallest(self):
+        if self._smallest is None:
+            raise ValueError('The smallest items are not being tracked')
+        return [item for k, order, item in sorted(self._smallest, reverse=True)]
+
+    def __len__(self):
+        return len(self._largest if self._largest is not None else self._smallest)
+
+
+# Example use
+if __name__ == '__main__':
+    from operator import itemgetter
+
+    nums = [1, 8, 2, 23, 7, -4, 18, 23, 42, 37, 2]
+    top = TopN(3, smallest=True).update(nums)
+    print(top.nlargest())   # [42, 37, 23]
+    print(top.nsmallest())  # [-4, 1, 2]
+
+    portfolio = [
+        {'name': 'IBM', 'shares': 100, 'price': 91.1},
+        {'name': 'AAPL', 'shares': 50, 'price': 543.22},
+        {'name': 'FB', 'shares': 200, 'price': 21.09},
+        {'name': 'HPQ', 'shares': 35, 'price': 31.75},
+        {'name': 'YHOO', 'shares': 45, 'price': 16.35},
+        {'name': 'ACME', 'shares': 75, 'price': 115.65},
+    ]
+    # Two shards of the data, merged
+    expensive = TopN(3, key=itemgetter('price')).update(portfolio[:3])
+    expensive.merge(TopN(3, key=itemgetter('price')).update(portfolio[3:]))
+    print(expensive.nlargest())
+
+    if np is not None:
+        prices = np.random.random(1000000)
+        top = TopN(100, smallest=True).update_array(prices)
+        assert top.nlargest() == heapq.nlargest(100, prices.tolist())
+        assert top.nsmallest() == heapq.nsmallest(100, prices.tolist())
+
+"""
+The heap holding the largest items is a min heap, so heap[0] is the
+smallest of them - the one to throw out when something larger turns up.
+heapreplace() pops it and pushes the new item in one step. The smallest
+items are kept in a max heap the same way, by wrapping each key in _Reverse.
+
+Each entry holds -count as well as the key. Among equal keys the entry
+pushed last is then the first to go, so the earlier items are kept, which
+is what nlargest() and nsmallest() return too.
+
+update_array() first drops everything that can not beat the current Nth
+item, then argpartition() finds the N best of what is left in O(len) time
+without sorting. Only those are added to the heap, in their original order.
+When several keys tie for Nth place argpartition() may pick any of them, so
+in that case the items returned may differ from heapq's, though the keys will not.
+"""